@@ -0,0 +1,89 @@
+import sys
+import os
+import json
+import logging
+import argparse
+
+# Logger setup
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+console_handler = logging.StreamHandler(stream=sys.stderr)  # Send logs to stderr
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Add `lib/python_utils` directory to Python path
+sys.path.append("/app/lib/python_utils")
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "../lib/python_utils"))
+
+try:
+    import catalog1
+except ImportError as e:
+    logger.error("Error: Required module not found: %s", e)
+    sys.exit(1)
+
+
+def default_catalog_path(config_file="./conf/app_config.json"):
+    """
+    Returns the catalog path from the app config, if it can be read.
+    """
+    try:
+        with open(config_file, "r") as file:
+            config = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return config.get("catalog", {}).get(
+        "path", os.path.join(config.get("target_usb_mount", "."), catalog1.CATALOG_FILENAME)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or import the video catalog.")
+    parser.add_argument("--catalog", default=default_catalog_path(), help="Catalog database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import existing .json sidecars")
+    import_parser.add_argument("root", help="Directory to scan for sidecars")
+
+    query_parser = subparsers.add_parser("query", help="Query catalogued videos")
+    query_parser.add_argument("--uploader")
+    query_parser.add_argument("--from", dest="date_from", help="Earliest video_date, YYYYMMDD")
+    query_parser.add_argument("--to", dest="date_to", help="Latest video_date, YYYYMMDD")
+    query_parser.add_argument("--id", dest="video_id")
+    query_parser.add_argument("--codec", dest="vcodec", help="Video codec prefix, e.g. avc1")
+    query_parser.add_argument("--resolution", help="e.g. 1920x1080")
+    query_parser.add_argument("--limit", type=int)
+    query_parser.add_argument("--json", action="store_true", help="Print full rows as JSON lines")
+
+    args = parser.parse_args()
+    if not args.catalog:
+        logger.error("No catalog path given and none found in the config.")
+        sys.exit(1)
+
+    if args.command == "import":
+        counts = catalog1.import_sidecars(args.catalog, args.root)
+        print(json.dumps(counts))
+        return
+
+    rows = catalog1.query_videos(
+        args.catalog,
+        uploader=args.uploader,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        video_id=args.video_id,
+        vcodec=args.vcodec,
+        resolution=args.resolution,
+        limit=args.limit,
+    )
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            print(f"{row['video_date']}\t{row['uploader']}\t{row['video_id']}\t{row['original_filename']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,10 @@ sys.path.append(lib_path)
 # Attempt to import modules
 try:
     import downloader5
+    import fetcher1
+    import formats1
+    import profiler1
+    import staging1
     import utilities1
 except ImportError as e:
     logger.error("Error: Required module not found: %s", e)
@@ -69,16 +73,7 @@ except Exception as e:
 
 # Main Function
 def main():
-    params = {
-        "download_path": config["download_path"],
-        "cookie_path": (
-            config.get("cookie_path")
-            if os.path.exists(os.path.expanduser(config.get("cookie_path", "")))
-            else None
-        ),
-        "url": None,
-        **config.get("watermark_config", {}),
-    }
+    params = utilities1.build_download_params(config)
 
     # Check for URL in command-line arguments
     if len(sys.argv) < 2:
@@ -90,21 +85,51 @@ def main():
     # Execute functions
     function_calls = [
         downloader5.mask_metadata,
+        formats1.plan_format,
+        staging1.admit_job,
+        staging1.stage_download_path,
         downloader5.create_original_filename,
+        fetcher1.start_auxiliary_download,
         downloader5.download_video,
+        fetcher1.collect_auxiliary_download,
+        staging1.transfer_to_target,
         utilities1.store_params_as_json,
     ]
 
+    # Group the job's sidecar fsyncs into one flush at the end
+    batch_fsync = params["sidecar"].get("batch_fsync", False)
+    if batch_fsync:
+        utilities1.begin_sidecar_batch()
+
+    profiler = profiler1.start_if_enabled(config)
+
     for func in function_calls:
         logger.info(f"Entering function: {func.__name__}")
         try:
-            result = func(params)
+            with profiler1.stage(profiler, func.__name__):
+                result = func(params)
             if result:
                 params.update(result)
+        except staging1.InsufficientSpaceError as e:
+            logger.error(f"Job not admitted: {e}")
+            sys.exit(1)
         except Exception as e:
             logger.error(f"Error executing {func.__name__}: {e}")
             logger.debug(traceback.format_exc())
 
+    if batch_fsync:
+        utilities1.flush_sidecar_batch(fsync=params["sidecar"].get("fsync", True))
+
+    # Staged files must reach the target before the filename is handed on
+    transfer_failures = staging1.wait_for_transfers()
+
+    profiler1.finish(profiler, params.get("original_filename"), "download")
+
+    if transfer_failures:
+        for failure in transfer_failures:
+            logger.error(f"Failed to move {failure['src']} to {failure['dst']}: {failure['error']}")
+        sys.exit(1)
+
     # Return the original filename
     original_filename = params.get("original_filename", "")
     if original_filename:
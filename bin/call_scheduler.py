@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+import logging
+import argparse
+from datetime import datetime
+
+# Logger setup
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+console_handler = logging.StreamHandler(stream=sys.stderr)  # Send logs to stderr
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Add `lib/python_utils` directory to Python path
+sys.path.append("/app/lib/python_utils")
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "../lib/python_utils"))
+
+try:
+    import scheduler1
+    import utilities1
+except ImportError as e:
+    logger.error("Error: Required module not found: %s", e)
+    sys.exit(1)
+
+# Load Config
+config_file = "./conf/app_config.json"
+
+try:
+    with open(config_file, "r") as file:
+        config = json.load(file)
+except FileNotFoundError:
+    logger.error(f"Error: Configuration file '{config_file}' not found.")
+    sys.exit(1)
+
+download_date = datetime.now().strftime("%Y-%m-%d")
+config["download_path"] = os.path.abspath(os.path.join(config["target_usb_mount"], download_date))
+
+scheduler_config = config.get("scheduler", {})
+db_path = scheduler_config.get(
+    "path", os.path.join(config["target_usb_mount"], scheduler1.SCHEDULER_FILENAME)
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue and run download/watermark jobs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Queue a URL")
+    enqueue_parser.add_argument("url")
+    enqueue_parser.add_argument("--priority", type=int, default=0)
+    enqueue_parser.add_argument("--no-watermark", action="store_true")
+
+    run_parser = subparsers.add_parser("run", help="Run the worker")
+    run_parser.add_argument("--once", action="store_true", help="Exit when no job is ready")
+
+    status_parser = subparsers.add_parser("status", help="List jobs")
+    status_parser.add_argument("--state", choices=[
+        scheduler1.QUEUED, scheduler1.RUNNING, scheduler1.DONE, scheduler1.FAILED
+    ])
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        try:
+            os.makedirs(config["download_path"], exist_ok=True)
+        except Exception as e:
+            logger.error(f"Failed to create directory: {config['download_path']}, Error: {e}")
+            sys.exit(1)
+        params = utilities1.build_download_params(config)
+        params["url"] = args.url.strip()
+        params["user_id"] = config.get("user_id", "DefaultUser")
+        job_id = scheduler1.enqueue_job(
+            db_path, params, priority=args.priority, watermark=not args.no_watermark
+        )
+        print(job_id)
+    elif args.command == "run":
+        processed = scheduler1.run_worker(
+            db_path, scheduler_config, once=args.once, staging_config=config.get("staging")
+        )
+        logger.info(f"Worker processed {processed} job(s)")
+    else:
+        for job in scheduler1.list_jobs(db_path, args.state):
+            print(f"{job['id']}\t{job['state']}\tp{job['priority']}\tstage {job['stage_index']}"
+                  f"\tattempts {job['attempts']}\t{job['url']}\t{job['worker_id'] or ''}"
+                  f"\t{job['last_error'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
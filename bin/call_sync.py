@@ -0,0 +1,82 @@
+import sys
+import os
+import json
+import logging
+import argparse
+from datetime import datetime
+
+# Logger setup
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+console_handler = logging.StreamHandler(stream=sys.stderr)  # Send logs to stderr
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Add `lib/python_utils` directory to Python path
+sys.path.append("/app/lib/python_utils")
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "../lib/python_utils"))
+
+try:
+    import scheduler1
+    import sync1
+    import utilities1
+except ImportError as e:
+    logger.error("Error: Required module not found: %s", e)
+    sys.exit(1)
+
+# Load Config
+config_file = "./conf/app_config.json"
+
+try:
+    with open(config_file, "r") as file:
+        config = json.load(file)
+except FileNotFoundError:
+    logger.error(f"Error: Configuration file '{config_file}' not found.")
+    sys.exit(1)
+
+download_date = datetime.now().strftime("%Y-%m-%d")
+config["download_path"] = os.path.abspath(os.path.join(config["target_usb_mount"], download_date))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mirror a playlist or channel incrementally.")
+    parser.add_argument("url", help="Playlist or channel URL")
+    parser.add_argument("--watermark", action="store_true", help="Also watermark new videos")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue new entries on the job scheduler instead of downloading now")
+    parser.add_argument("--priority", type=int, default=0, help="Priority for queued jobs")
+    args = parser.parse_args()
+
+    try:
+        os.makedirs(config["download_path"], exist_ok=True)
+    except Exception as e:
+        logger.error(f"Failed to create directory: {config['download_path']}, Error: {e}")
+        sys.exit(1)
+
+    params = utilities1.build_download_params(config)
+    params["url"] = args.url.strip()
+    params["user_id"] = config.get("user_id", "DefaultUser")
+    params["sync"] = config.get("sync", {})
+    params["archive_path"] = config.get("sync", {}).get(
+        "archive_path", os.path.join(config["target_usb_mount"], sync1.ARCHIVE_FILENAME)
+    )
+
+    enqueue_db = None
+    if args.enqueue:
+        enqueue_db = config.get("scheduler", {}).get(
+            "path", os.path.join(config["target_usb_mount"], scheduler1.SCHEDULER_FILENAME)
+        )
+
+    counts = sync1.sync_playlist(
+        params, watermark=args.watermark, enqueue_db=enqueue_db, priority=args.priority
+    )
+    logger.info(f"Sync finished: {counts}")
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
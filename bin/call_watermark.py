@@ -9,6 +9,11 @@ from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
 import logging
 import json
 import sys
+import traceback
+
+sys.path.append("/app/lib/python_utils")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../lib/python_utils"))
+import profiler1
 
 
 
@@ -135,6 +140,19 @@ def add_watermark(params):
         return None
 
 
+def run_watermark(params):
+    """
+    Watermarks with the configured frame engine: "rawpipe" goes through
+    watermarker2 (raw-frame pipeline with MoviePy fallback), anything else
+    uses add_watermark above.
+    """
+    if params.get("frame_engine") == "rawpipe":
+        import watermarker2
+
+        return watermarker2.add_watermark(params)
+    return add_watermark(params)
+
+
 if __name__ == "__main__":
     # Prepare the parameters from the configuration or command-line arguments
     config_file = "./conf/app_config.json"
@@ -159,12 +177,19 @@ if __name__ == "__main__":
         "username_position": tuple(config.get("watermark_config", {}).get("username_position", ["left", "top"])),
         "date_position": tuple(config.get("watermark_config", {}).get("date_position", ["left", "bottom"])),
         "timestamp_position": tuple(config.get("watermark_config", {}).get("timestamp_position", ["right", "bottom"])),
+        "frame_engine": config.get("watermark_config", {}).get("frame_engine", "moviepy"),
     }
 
     # Call the watermarking function
     try:
         logger.info("Starting watermarking process...")
-        result = add_watermark(params)
+        profiler = profiler1.start_if_enabled(config)
+        try:
+            with profiler1.stage(profiler, "add_watermark"):
+                result = run_watermark(params)
+        finally:
+            # Next to the input's .json sidecar
+            profiler1.finish(profiler, params["input_video_path"], "watermark")
         if result and "to_process" in result:
             logger.info(f"Watermarked video created: {result['to_process']}")
             print(result["to_process"])  # Print the output filename
@@ -0,0 +1,308 @@
+# catalog1.py
+# SQLite catalog of downloaded videos
+# fed by mask_metadata and store_params_as_json, plus an incremental
+# importer for sidecars written before the catalog existed
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import traceback
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+CATALOG_FILENAME = "frobnitz_catalog.sqlite3"
+
+# JSON files written next to videos that are not params sidecars
+NON_PARAMS_MARKERS = (".chapters.", ".profile.")
+
+# Catalog columns filled from params / masked metadata
+CATALOG_FIELDS = [
+    "video_title",
+    "video_date",
+    "uploader",
+    "url",
+    "duration",
+    "width",
+    "height",
+    "resolution",
+    "fps",
+    "ext",
+    "filesize",
+    "tbr",
+    "vcodec",
+    "acodec",
+    "original_filename",
+    "config_json",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    video_title TEXT,
+    video_date TEXT,
+    uploader TEXT,
+    url TEXT,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    resolution TEXT,
+    fps REAL,
+    ext TEXT,
+    filesize INTEGER,
+    tbr REAL,
+    vcodec TEXT,
+    acodec TEXT,
+    original_filename TEXT,
+    config_json TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_videos_uploader_date ON videos (uploader, video_date);
+CREATE INDEX IF NOT EXISTS idx_videos_date ON videos (video_date);
+CREATE INDEX IF NOT EXISTS idx_videos_vcodec ON videos (vcodec);
+CREATE INDEX IF NOT EXISTS idx_videos_resolution ON videos (resolution);
+CREATE TABLE IF NOT EXISTS imported_sidecars (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER
+);
+"""
+
+
+def get_catalog_path(params):
+    """
+    Returns the catalog database path configured in params.
+
+    Args:
+        params (dict): Parameters, may contain 'catalog' with 'enabled' and 'path'.
+
+    Returns:
+        str: Path of the catalog database, or None if the catalog is disabled.
+    """
+    catalog_config = params.get("catalog") or {}
+    if not catalog_config.get("enabled", True):
+        return None
+    return catalog_config.get("path")
+
+
+def connect(catalog_path):
+    """
+    Opens the catalog database, creating the schema if needed.
+
+    Args:
+        catalog_path (str): Path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: An open connection with rows as sqlite3.Row.
+    """
+    connection = sqlite3.connect(catalog_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _catalog_key(record):
+    """
+    Returns the yt-dlp id of a record, or its original_filename for legacy
+    sidecars without one, so record_video and import_sidecars agree on the key.
+    """
+    return record.get("id") or record.get("video_id") or record.get("original_filename")
+
+
+def _catalog_row(record):
+    """
+    Picks the catalog columns out of a params or sidecar dictionary.
+    """
+    row = {}
+    for field in CATALOG_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, (str, int, float)):
+            value = json.dumps(value)
+        row[field] = value
+    return row
+
+
+def upsert_video(connection, video_id, record):
+    """
+    Inserts or updates a video row, keeping existing values for fields
+    the record does not provide.
+
+    Args:
+        connection (sqlite3.Connection): Open catalog connection.
+        video_id (str): Catalog key of the video.
+        record (dict): Params, masked metadata or sidecar contents.
+    """
+    row = _catalog_row(record)
+    columns = ["video_id"] + list(row)
+    updates = ", ".join(
+        f"{field} = COALESCE(excluded.{field}, {field})" for field in row
+    )
+    connection.execute(
+        f"INSERT INTO videos ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT(video_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP",
+        [video_id] + list(row.values()),
+    )
+
+
+def record_video(params, record=None):
+    """
+    Writes a video into the catalog configured in params. Failures are
+    logged and never interrupt the download pipeline.
+
+    Args:
+        params (dict): Parameters including the 'catalog' configuration.
+        record (dict): Fields to store; defaults to params itself.
+
+    Returns:
+        bool: True if the video was recorded.
+    """
+    catalog_path = get_catalog_path(params)
+    record = dict(params, **record) if record is not None else params
+    video_id = _catalog_key(record)
+    if not catalog_path or not video_id:
+        return False
+    try:
+        connection = connect(catalog_path)
+        try:
+            with connection:
+                upsert_video(connection, video_id, record)
+        finally:
+            connection.close()
+        return True
+    except Exception as e:
+        logger.error(f"Failed to record video in catalog {catalog_path}: {e}")
+        logger.debug(traceback.format_exc())
+        return False
+
+
+def _load_sidecar(path):
+    """
+    Reads a plain or gzip-compressed JSON sidecar.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def import_sidecars(catalog_path, root):
+    """
+    Imports params sidecars under root into the catalog. Sidecars whose
+    size and mtime are unchanged since the last import are skipped.
+
+    Args:
+        catalog_path (str): Path of the SQLite database.
+        root (str): Directory to scan recursively.
+
+    Returns:
+        dict: Counts under 'imported', 'skipped' and 'failed'.
+    """
+    counts = {"imported": 0, "skipped": 0, "failed": 0}
+    connection = connect(catalog_path)
+    try:
+        seen = {
+            row["path"]: (row["mtime"], row["size"])
+            for row in connection.execute("SELECT path, mtime, size FROM imported_sidecars")
+        }
+        with connection:
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if not filename.endswith((".json", ".json.gz")):
+                        continue
+                    if filename.startswith(".") or any(
+                        marker in filename for marker in NON_PARAMS_MARKERS
+                    ):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    stat = os.stat(path)
+                    if seen.get(path) == (stat.st_mtime, stat.st_size):
+                        counts["skipped"] += 1
+                        continue
+                    try:
+                        record = _load_sidecar(path)
+                    except Exception as e:
+                        logger.warning(f"Skipping unreadable sidecar {path}: {e}")
+                        counts["failed"] += 1
+                    else:
+                        # Only params sidecars describe a downloaded video
+                        if isinstance(record, dict) and "original_filename" in record:
+                            record.setdefault("config_json", path)
+                            upsert_video(connection, _catalog_key(record), record)
+                            counts["imported"] += 1
+                        else:
+                            counts["skipped"] += 1
+                    # Remembered either way, so unchanged files are not parsed again
+                    connection.execute(
+                        "INSERT OR REPLACE INTO imported_sidecars (path, mtime, size) VALUES (?, ?, ?)",
+                        (path, stat.st_mtime, stat.st_size),
+                    )
+    finally:
+        connection.close()
+    logger.info(f"Sidecar import finished: {counts}")
+    return counts
+
+
+def query_videos(catalog_path, uploader=None, date_from=None, date_to=None,
+                 video_id=None, vcodec=None, resolution=None, limit=None):
+    """
+    Queries the catalog using the indexed columns.
+
+    Args:
+        catalog_path (str): Path of the SQLite database.
+        uploader (str): Exact uploader name.
+        date_from (str): Earliest video_date (YYYYMMDD), inclusive.
+        date_to (str): Latest video_date (YYYYMMDD), inclusive.
+        video_id (str): Exact video id.
+        vcodec (str): Video codec prefix, e.g. 'avc1' or 'vp9'.
+        resolution (str): Exact resolution, e.g. '1920x1080'.
+        limit (int): Maximum number of rows.
+
+    Returns:
+        list: Matching rows as dictionaries, ordered by video_date.
+    """
+    clauses, args = [], []
+    if video_id:
+        clauses.append("video_id = ?")
+        args.append(video_id)
+    if uploader:
+        clauses.append("uploader = ?")
+        args.append(uploader)
+    if date_from:
+        clauses.append("video_date >= ?")
+        args.append(date_from)
+    if date_to:
+        clauses.append("video_date <= ?")
+        args.append(date_to)
+    if vcodec:
+        # GLOB is case sensitive and can use the vcodec index
+        clauses.append("vcodec GLOB ?")
+        args.append(f"{vcodec}*")
+    if resolution:
+        clauses.append("resolution = ?")
+        args.append(resolution)
+
+    sql = "SELECT * FROM videos"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY video_date"
+    if limit:
+        sql += " LIMIT ?"
+        args.append(int(limit))
+
+    connection = connect(catalog_path)
+    try:
+        return [dict(row) for row in connection.execute(sql, args)]
+    finally:
+        connection.close()
@@ -4,12 +4,14 @@
 # adding logging
 
 import yt_dlp
-import requests
 import os
-import json
 import traceback
 import time
 import logging
+import threading
+
+import catalog1
+import utilities1
 
 ####################
 # Logger setup
@@ -23,20 +25,68 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 ###########################
 
+# Info dicts from extract_metadata, keyed by URL, so later stages
+# (auxiliary assets, format selection) don't re-run extraction
+_metadata_cache = {}
+
+# Filenames handed out by create_original_filename in this process; the
+# files only appear once yt-dlp starts writing, so parallel jobs must not
+# rely on os.path.exists alone
+_reserved_filenames = set()
+_filename_lock = threading.Lock()
+
+
+def get_cached_metadata(url):
+    """
+    Returns the info dict extracted earlier for a URL.
+
+    Args:
+        url (str): Video URL.
+
+    Returns:
+        dict: The cached info dict, or None if the URL was not extracted yet.
+    """
+    return _metadata_cache.get(url)
+
+
+def get_metadata(params):
+    """
+    Returns the info dict for params['url'], extracting it again when this
+    process has none cached, e.g. for a job resumed by a restarted worker
+    or retried after the cache was cleared.
 
+    Args:
+        params (dict): Parameters including 'url' and 'cookie_path'.
 
+    Returns:
+        dict: The info dict, or None if extraction fails.
+    """
+    info_dict = _metadata_cache.get(params.get("url"))
+    if info_dict is None and params.get("url"):
+        logger.info(f"No cached metadata for {params['url']}, extracting again")
+        # The metadata sidecar was written on the first extraction
+        info_dict = extract_metadata(dict(params, metadata_path=None)) or None
+    return info_dict
 
 
+def clear_cached_metadata(url):
+    """
+    Drops the cached info dict for a URL once its job no longer needs it.
 
+    Args:
+        url (str): Video URL.
+    """
+    _metadata_cache.pop(url, None)
 
 
-def unique_output_path(path, filename):
+def unique_output_path(path, filename, other_paths=()):
     """
     Generates a unique output file path by appending a counter to the filename if it already exists.
 
     Args:
         path (str): Directory path.
         filename (str): Original filename.
+        other_paths (iterable): Further directories the filename must also be free in.
 
     Returns:
         str: A unique file path.
@@ -44,7 +94,10 @@ def unique_output_path(path, filename):
     base, ext = os.path.splitext(filename)
     counter = 1
     unique_filename = filename
-    while os.path.exists(os.path.join(path, unique_filename)):
+    while os.path.join(path, unique_filename) in _reserved_filenames or any(
+        os.path.exists(os.path.join(directory, unique_filename))
+        for directory in (path, *other_paths)
+    ):
         unique_filename = f"{base}_{counter}{ext}"
         counter += 1
     return os.path.join(path, unique_filename)
@@ -85,11 +138,17 @@ def extract_metadata(params):
             info_dict = ydl.extract_info(
                 url, download=False
             )  # Extract metadata without downloading
+            _metadata_cache[url] = info_dict
 
             # Save metadata to file
             if metadata_path:
-                with open(metadata_path, "w", encoding="utf-8") as f:
-                    json.dump(info_dict, f, indent=4, ensure_ascii=False)
+                sidecar_config = params.get("sidecar") or {}
+                metadata_path = utilities1.write_json_atomic(
+                    metadata_path,
+                    info_dict,
+                    encoding=sidecar_config.get("encoding", "pretty"),
+                    fsync=sidecar_config.get("fsync", True),
+                )
                 logger.info(f"Metadata saved to {metadata_path}")
 
             return info_dict
@@ -179,6 +238,8 @@ def mask_metadata(params):
             if key in filtered_metadata:
                 masked_metadata[key] = filtered_metadata[key]
 
+        catalog1.record_video(params, masked_metadata)
+
     logger.info("Metadata masking complete")
     return masked_metadata
 
@@ -215,8 +276,13 @@ def create_original_filename(params):
     ext = params.get("ext", "mp4")  # Default to mp4 if not specified
     output_filename = f"{video_uploader_filename}_{video_date}.{ext}"
     
-    # Generate a unique filename to avoid overwrites
-    unique_filename = unique_output_path(download_path, output_filename)
+    # Generate a unique filename to avoid overwrites, on the staging target as well
+    target_path = params.get("target_path")
+    with _filename_lock:
+        unique_filename = unique_output_path(
+            download_path, output_filename, [target_path] if target_path else []
+        )
+        _reserved_filenames.add(unique_filename)
 
     # Update params with the generated filename
     params["original_filename"] = unique_filename
@@ -255,14 +321,24 @@ def download_video(params):
         logger.info(f"Starting download for URL: {url}")
 
         # Set up yt-dlp options for actual download based on video_download_config
+        configured_format = video_download_config.get("format", "bestvideo+bestaudio/best")
+        cookie_path = video_download_config.get("cookie_path")
         ydl_opts = {
             "outtmpl": params["original_filename"],
-            "cookiefile": video_download_config.get("cookie_path"),
-            "format": video_download_config.get("format", "bestvideo+bestaudio/best"),
+            "cookiefile": (
+                cookie_path if cookie_path and os.path.exists(cookie_path) else None
+            ),
+            "format": configured_format,
             "noplaylist": video_download_config.get("noplaylist", True),
             "verbose": True,
         }
 
+        # Use the format chosen by formats1.plan_format, falling back to the configured selector
+        if params.get("format_id"):
+            ydl_opts["format"] = f"{params['format_id']}/{configured_format}"
+        if params.get("merge_output_format"):
+            ydl_opts["merge_output_format"] = params["merge_output_format"]
+
         logger.debug(f"yt-dlp options: {ydl_opts}")
 
         # Perform the video download
@@ -300,8 +376,13 @@ def save_params_to_json(params):
         json_filename = os.path.splitext(original_filename)[0] + ".json"
 
         # Save the parameters to a JSON file
-        with open(json_filename, "w", encoding="utf-8") as json_file:
-            json.dump(params, json_file, indent=4, ensure_ascii=False)
+        sidecar_config = params.get("sidecar") or {}
+        json_filename = utilities1.write_json_atomic(
+            json_filename,
+            params,
+            encoding=sidecar_config.get("encoding", "pretty"),
+            fsync=sidecar_config.get("fsync", True),
+        )
 
         logger.info(f"Parameters saved to JSON file: {json_filename}")
     except Exception as e:
@@ -0,0 +1,299 @@
+# fetcher1.py
+# auxiliary asset downloads (thumbnails, subtitles, chapters)
+# one pooled requests.Session shared by an asyncio fan-out
+# runs in the background while yt-dlp fetches the main video
+
+import asyncio
+import logging
+import os
+import threading
+import traceback
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+DEFAULT_ASSET_CONFIG = {
+    "enabled": True,
+    "thumbnails": True,
+    "subtitles": ["en"],
+    "automatic_captions": False,
+    "subtitle_format": "vtt",
+    "chapters": True,
+    "max_connections_per_host": 4,
+    "timeout": 30,
+}
+
+# Background fetches keyed by original_filename
+_pending = {}
+_pending_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=DEFAULT_ASSET_CONFIG["max_connections_per_host"]):
+    """
+    Returns the shared, pooled HTTP session, creating it on first use.
+
+    Args:
+        pool_size (int): Number of keep-alive connections kept per host.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_asset_config(params):
+    """
+    Merges the 'auxiliary_assets' section of params over the defaults.
+
+    Args:
+        params (dict): The input dictionary, may contain 'auxiliary_assets'.
+
+    Returns:
+        dict: The effective asset configuration.
+    """
+    asset_config = dict(DEFAULT_ASSET_CONFIG)
+    asset_config.update(params.get("auxiliary_assets") or {})
+    return asset_config
+
+
+def select_auxiliary_assets(info_dict, base_path, asset_config):
+    """
+    Picks the thumbnail and subtitle URLs to fetch from a yt-dlp info dict.
+
+    Args:
+        info_dict (dict): Info dict as returned by downloader5.extract_metadata.
+        base_path (str): Output path of the video without extension.
+        asset_config (dict): Effective asset configuration.
+
+    Returns:
+        list: (kind, url, destination) tuples.
+    """
+    assets = []
+
+    if asset_config.get("thumbnails"):
+        thumbnail_url = info_dict.get("thumbnail")
+        if not thumbnail_url and info_dict.get("thumbnails"):
+            # yt-dlp sorts thumbnails worst to best
+            thumbnail_url = info_dict["thumbnails"][-1].get("url")
+        if thumbnail_url:
+            ext = os.path.splitext(urlparse(thumbnail_url).path)[1] or ".jpg"
+            assets.append(("thumbnail", thumbnail_url, f"{base_path}{ext}"))
+
+    languages = asset_config.get("subtitles") or []
+    tracks = dict(info_dict.get("subtitles") or {})
+    if asset_config.get("automatic_captions"):
+        for lang, formats in (info_dict.get("automatic_captions") or {}).items():
+            tracks.setdefault(lang, formats)
+    preferred_ext = asset_config.get("subtitle_format", "vtt")
+    for lang in languages:
+        formats = tracks.get(lang) or []
+        if not formats:
+            continue
+        chosen = next((f for f in formats if f.get("ext") == preferred_ext), formats[0])
+        if chosen.get("url"):
+            ext = chosen.get("ext", preferred_ext)
+            assets.append((f"subtitle:{lang}", chosen["url"], f"{base_path}.{lang}.{ext}"))
+
+    return assets
+
+
+def _fetch_one(session, url, destination, timeout):
+    """
+    Streams a single URL to disk through the shared session.
+    """
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(destination, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    return destination
+
+
+async def fetch_assets(assets, max_per_host=4, timeout=30):
+    """
+    Downloads all assets concurrently, limiting in-flight requests per host.
+
+    Args:
+        assets (list): (kind, url, destination) tuples.
+        max_per_host (int): Maximum concurrent requests to a single host.
+        timeout (int): Per-request timeout in seconds.
+
+    Returns:
+        dict: Mapping of asset kind to saved path, or None if the fetch failed.
+    """
+    session = get_session(max_per_host)
+    semaphores = {}
+
+    async def fetch(kind, url, destination):
+        host = urlparse(url).netloc
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(max_per_host))
+        async with semaphore:
+            try:
+                path = await asyncio.to_thread(_fetch_one, session, url, destination, timeout)
+                logger.info(f"Fetched {kind} to {path}")
+                return kind, path
+            except Exception as e:
+                logger.error(f"Failed to fetch {kind} from {url}: {e}")
+                logger.debug(traceback.format_exc())
+                return kind, None
+
+    results = await asyncio.gather(*(fetch(*asset) for asset in assets))
+    return dict(results)
+
+
+def write_chapters(info_dict, base_path, sidecar_config=None):
+    """
+    Writes the chapter list of an info dict to a .chapters.json sidecar.
+
+    Args:
+        info_dict (dict): Info dict as returned by downloader5.extract_metadata.
+        base_path (str): Output path of the video without extension.
+        sidecar_config (dict): The 'sidecar' config (encoding, fsync).
+
+    Returns:
+        str: Path of the chapters file, or None if the video has no chapters.
+    """
+    import utilities1
+
+    chapters = info_dict.get("chapters")
+    if not chapters:
+        return None
+    sidecar_config = sidecar_config or {}
+    chapters_path = utilities1.write_json_atomic(
+        f"{base_path}.chapters.json",
+        chapters,
+        encoding=sidecar_config.get("encoding", "pretty"),
+        fsync=sidecar_config.get("fsync", True),
+        # Staging moves it with the video, so it must exist on disk now
+        batch=False,
+    )
+    logger.info(f"Chapters saved to {chapters_path}")
+    return chapters_path
+
+
+def download_auxiliary_assets(params, info_dict=None):
+    """
+    Downloads thumbnails, subtitles and chapter data for a video, blocking until done.
+
+    Args:
+        params (dict): Parameters including 'original_filename' and 'url'.
+        info_dict (dict): Info dict from extract_metadata; looked up in the
+            downloader5 cache, or extracted again, when omitted.
+
+    Returns:
+        dict: A dictionary with key 'auxiliary_assets_saved' mapping asset kind to path.
+    """
+    asset_config = get_asset_config(params)
+    original_filename = params.get("original_filename")
+    if not asset_config.get("enabled") or not original_filename:
+        return {"auxiliary_assets_saved": {}}
+
+    if info_dict is None:
+        import downloader5
+
+        info_dict = downloader5.get_metadata(params)
+    if not info_dict:
+        logger.warning("No metadata available, skipping auxiliary assets.")
+        return {"auxiliary_assets_saved": {}}
+
+    base_path = os.path.splitext(original_filename)[0]
+    saved = {}
+    if asset_config.get("chapters"):
+        chapters_path = write_chapters(info_dict, base_path, params.get("sidecar"))
+        if chapters_path:
+            saved["chapters"] = chapters_path
+
+    assets = select_auxiliary_assets(info_dict, base_path, asset_config)
+    if assets:
+        fetched = asyncio.run(
+            fetch_assets(
+                assets,
+                max_per_host=asset_config["max_connections_per_host"],
+                timeout=asset_config["timeout"],
+            )
+        )
+        saved.update({kind: path for kind, path in fetched.items() if path})
+
+    return {"auxiliary_assets_saved": saved}
+
+
+def start_auxiliary_download(params):
+    """
+    Starts download_auxiliary_assets in a background thread so the assets
+    are fetched while the main video downloads.
+
+    Args:
+        params (dict): Parameters including 'original_filename' and 'url'.
+
+    Returns:
+        None
+    """
+    original_filename = params.get("original_filename")
+    if not original_filename or not get_asset_config(params).get("enabled"):
+        return None
+
+    import downloader5
+
+    info_dict = downloader5.get_cached_metadata(params.get("url"))
+    result = {}
+
+    def run():
+        try:
+            result.update(download_auxiliary_assets(dict(params), info_dict))
+        except Exception as e:
+            logger.error(f"Auxiliary asset download failed: {e}")
+            logger.debug(traceback.format_exc())
+
+    thread = threading.Thread(target=run, name="auxiliary-assets", daemon=True)
+    with _pending_lock:
+        _pending[original_filename] = (thread, result)
+    thread.start()
+    logger.info(f"Started auxiliary asset download for {original_filename}")
+    return None
+
+
+def collect_auxiliary_download(params):
+    """
+    Waits for the background fetch started by start_auxiliary_download.
+    If this process never started one (a job resumed after a restart, or
+    retried after the fetch was lost), the assets are fetched here instead.
+
+    Args:
+        params (dict): Parameters including 'original_filename'.
+
+    Returns:
+        dict: A dictionary with key 'auxiliary_assets_saved', or None if assets are disabled.
+    """
+    with _pending_lock:
+        pending = _pending.pop(params.get("original_filename"), None)
+    if pending is None:
+        if params.get("auxiliary_assets_saved") or not get_asset_config(params).get("enabled"):
+            return None
+        return download_auxiliary_assets(params)
+    thread, result = pending
+    thread.join()
+    return {"auxiliary_assets_saved": result.get("auxiliary_assets_saved", {})}
@@ -0,0 +1,286 @@
+# formats1.py
+# budget-aware format selection
+# picks a yt-dlp format from the extracted format list under the
+# configured bitrate/size budget, preferring direct https downloads,
+# pre-muxed formats (no merge) and codecs the watermark encoder decodes cheaply
+
+import logging
+import re
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+# Cheapest to decode first; unknown codecs rank after these
+DEFAULT_VCODEC_PREFERENCE = ["avc1", "h264", "vp09", "vp9", "hev1", "hvc1", "av01"]
+
+# Direct downloads first; fragmented protocols (DASH segments, HLS) are
+# slower and fail more often. Unknown protocols rank after these
+PROTOCOL_RANK = {
+    "https": 0,
+    "http": 0,
+    "http_dash_segments": 1,
+    "m3u8_native": 2,
+    "m3u8": 2,
+}
+
+# Audio codecs that mux into each video container without a re-encode
+CONTAINER_AUDIO = {
+    "mp4": ["mp4a", "aac"],
+    "webm": ["opus", "vorbis"],
+}
+
+
+def parse_bitrate(value):
+    """
+    Parses a bitrate like '5000k', '5M' or 5000 into kbit/s.
+
+    Returns:
+        float: The bitrate in kbit/s, or None if value is empty.
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kKmM]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Unrecognised bitrate: {value}")
+    number, unit = float(match.group(1)), match.group(2).lower()
+    return number * 1000 if unit == "m" else number
+
+
+def parse_size(value):
+    """
+    Parses a size like '500M', '2G' or 1048576 into bytes.
+
+    Returns:
+        int: The size in bytes, or None if value is empty.
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kKmMgG]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Unrecognised size: {value}")
+    factor = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}[match.group(2).lower()]
+    return int(float(match.group(1)) * factor)
+
+
+def _has(codec):
+    return codec not in (None, "none")
+
+
+def format_bitrate(fmt, duration):
+    """
+    Returns a format's bitrate in kbit/s from tbr, vbr+abr or its size.
+    """
+    if fmt.get("tbr"):
+        return float(fmt["tbr"])
+    if fmt.get("vbr") or fmt.get("abr"):
+        return float((fmt.get("vbr") or 0) + (fmt.get("abr") or 0))
+    size = format_size(fmt)
+    if size and duration:
+        return size * 8 / 1000 / duration
+    return None
+
+
+def codec_rank(vcodec, preference):
+    """
+    Returns the decode-cost rank of a video codec (lower is cheaper).
+    """
+    vcodec = (vcodec or "").lower()
+    for rank, prefix in enumerate(preference):
+        if vcodec.startswith(prefix):
+            return rank
+    return len(preference)
+
+
+def protocol_rank(fmt):
+    """
+    Returns the download-cost rank of a format's protocol (lower is better).
+    """
+    return PROTOCOL_RANK.get(fmt.get("protocol") or "https", max(PROTOCOL_RANK.values()) + 1)
+
+
+def format_size(fmt):
+    """
+    Returns a format's reported size in bytes, or None.
+    """
+    return fmt.get("filesize") or fmt.get("filesize_approx")
+
+
+def merged_ext(video_format, audio_format):
+    """
+    Returns the container a video+audio pair can be merged into without re-encoding.
+    """
+    video_ext = video_format.get("ext")
+    acodec = (audio_format.get("acodec") or "").lower()
+    if any(acodec.startswith(prefix) for prefix in CONTAINER_AUDIO.get(video_ext, [])):
+        return video_ext
+    return "mkv"
+
+
+def build_candidates(formats, duration, max_height):
+    """
+    Builds pre-muxed and video+audio candidates with their estimated bitrate.
+
+    Returns:
+        list: Candidate dictionaries.
+    """
+    usable = [
+        f for f in formats
+        if f.get("format_id")
+        and f.get("protocol") != "mhtml"
+        and (max_height is None or not f.get("height") or f["height"] <= max_height)
+    ]
+    video_only = [f for f in usable if _has(f.get("vcodec")) and not _has(f.get("acodec"))]
+    audio_only = [f for f in usable if _has(f.get("acodec")) and not _has(f.get("vcodec"))]
+    muxed = [f for f in usable if _has(f.get("vcodec")) and _has(f.get("acodec"))]
+
+    candidates = []
+    for f in muxed:
+        candidates.append({
+            "format_id": f["format_id"],
+            "height": f.get("height") or 0,
+            "fps": f.get("fps") or 0,
+            "vcodec": f.get("vcodec"),
+            "bitrate": format_bitrate(f, duration),
+            "filesize": format_size(f),
+            "protocol_rank": protocol_rank(f),
+            "ext": f.get("ext"),
+            "merge": False,
+        })
+    for video in video_only:
+        video_bitrate = format_bitrate(video, duration)
+        video_size = format_size(video)
+        for audio in audio_only:
+            audio_bitrate = format_bitrate(audio, duration)
+            audio_size = format_size(audio)
+            candidates.append({
+                "format_id": f"{video['format_id']}+{audio['format_id']}",
+                "height": video.get("height") or 0,
+                "fps": video.get("fps") or 0,
+                "vcodec": video.get("vcodec"),
+                "bitrate": (
+                    video_bitrate + audio_bitrate
+                    if video_bitrate is not None and audio_bitrate is not None
+                    else None
+                ),
+                "filesize": video_size + audio_size if video_size and audio_size else None,
+                "protocol_rank": max(protocol_rank(video), protocol_rank(audio)),
+                "audio_bitrate": audio_bitrate or 0,
+                "ext": merged_ext(video, audio),
+                "merge": True,
+            })
+    return candidates
+
+
+def choose_format(candidates, budget_kbps, max_bytes, duration, preference):
+    """
+    Picks the best candidate within budget: highest resolution first, then
+    direct https over fragmented protocols, then no merge step, then
+    cheapest codec to decode, then a native container over an mkv remux,
+    then best audio, then highest frame rate, then fewest bytes. If nothing
+    fits, the candidate closest to the budget (the smallest) is taken.
+
+    Returns:
+        dict: The chosen candidate, or None if there are no candidates.
+    """
+    if not candidates:
+        return None
+
+    def within_budget(candidate):
+        bitrate = candidate["bitrate"]
+        if bitrate is None:
+            return budget_kbps is None and max_bytes is None
+        if budget_kbps is not None and bitrate > budget_kbps:
+            return False
+        if max_bytes is not None and duration and bitrate * 1000 / 8 * duration > max_bytes:
+            return False
+        return True
+
+    affordable = [c for c in candidates if within_budget(c)]
+    if not affordable:
+        # Nothing fits: the budget is a cap, so overshoot it as little as possible
+        sized = [c for c in candidates if c["bitrate"] is not None] or candidates
+        return min(
+            sized,
+            key=lambda c: (c["bitrate"] or 0, -c["height"], c["protocol_rank"], c["merge"]),
+        )
+
+    return min(
+        affordable,
+        key=lambda c: (
+            -c["height"],
+            c["protocol_rank"],
+            c["merge"],
+            codec_rank(c["vcodec"], preference),
+            c["ext"] == "mkv",
+            -c.get("audio_bitrate", 0),
+            -c["fps"],
+            c["bitrate"] or 0,
+        ),
+    )
+
+
+def plan_format(params):
+    """
+    Chooses a download format from the extracted format list and the
+    'video_download' budget (bitrate, max_filesize, max_height).
+
+    Args:
+        params (dict): Params after mask_metadata, including 'url' and 'video_download'.
+
+    Returns:
+        dict: 'format_id', 'ext', the estimated 'planned_filesize' in bytes (if
+              known) and, for merged formats, 'merge_output_format'; None if
+              planning is disabled or no format list is available.
+    """
+    import downloader5
+
+    video_download_config = params.get("video_download") or {}
+    if not video_download_config.get("plan_formats", True):
+        return None
+
+    info_dict = downloader5.get_metadata(params)
+    formats = (info_dict or {}).get("formats") or []
+    if not formats:
+        logger.warning("No format list available, keeping the configured format.")
+        return None
+
+    duration = info_dict.get("duration")
+    budget_kbps = parse_bitrate(video_download_config.get("bitrate"))
+    max_bytes = parse_size(video_download_config.get("max_filesize"))
+    max_height = video_download_config.get("max_height", 1080)
+    preference = video_download_config.get("prefer_vcodecs", DEFAULT_VCODEC_PREFERENCE)
+
+    candidates = build_candidates(formats, duration, max_height)
+    chosen = choose_format(candidates, budget_kbps, max_bytes, duration, preference)
+    if chosen is None:
+        logger.warning("No usable formats found, keeping the configured format.")
+        return None
+
+    logger.info(
+        f"Planned format {chosen['format_id']} ({chosen['height']}p, {chosen['vcodec']}, "
+        f"~{chosen['bitrate'] or 0:.0f}k, merge={chosen['merge']})"
+    )
+    result = {"format_id": chosen["format_id"], "ext": chosen["ext"]}
+    planned_filesize = chosen["filesize"]
+    if not planned_filesize and chosen["bitrate"] and duration:
+        planned_filesize = chosen["bitrate"] * 1000 / 8 * duration
+    if planned_filesize:
+        # Read by staging1.admit_job instead of the metadata's own estimate
+        result["planned_filesize"] = int(planned_filesize)
+    if chosen["merge"]:
+        result["merge_output_format"] = chosen["ext"]
+    return result
@@ -0,0 +1,293 @@
+# frameio1.py
+# raw-frame watermark engine for watermarker2
+# ffmpeg rawvideo -> readinto a ring of preallocated numpy buffers ->
+# overlays blended in place -> same memory written to the encoder pipe
+# no per-frame array allocations
+
+import logging
+import queue
+import subprocess
+import tempfile
+import threading
+import traceback
+
+import numpy as np
+from imageio_ffmpeg import get_ffmpeg_exe
+from moviepy.video.VideoClip import TextClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+import profiler1
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+RING_SIZE = 4
+TIMESTAMP_GLYPHS = "0123456789:"
+
+
+class Overlay:
+    """
+    A pre-rendered RGBA overlay with the scratch buffers needed to blend it
+    into a frame region without allocating.
+
+    Alpha is stored on a 0..256 scale so the blend divides with a shift:
+    out = (rgb * alpha + frame * (256 - alpha)) >> 8
+    """
+
+    def __init__(self, rgb, alpha):
+        height, width = alpha.shape
+        alpha16 = np.rint(alpha * 256).astype(np.uint16)[:, :, None]
+        self.width = width
+        self.height = height
+        self.premultiplied = rgb.astype(np.uint16) * alpha16
+        self.inverse_alpha = np.broadcast_to(256 - alpha16, (height, width, 3)).copy()
+        self.scratch = np.empty((height, width, 3), dtype=np.uint16)
+
+    def blend_into(self, frame, x, y):
+        """
+        Blends the overlay into frame at (x, y), in place, clipped to the frame.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + self.width, frame_width), min(y + self.height, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        ox, oy = x0 - x, y0 - y
+        h, w = y1 - y0, x1 - x0
+        region = frame[y0:y1, x0:x1]
+        scratch = self.scratch[oy:oy + h, ox:ox + w]
+        np.multiply(region, self.inverse_alpha[oy:oy + h, ox:ox + w], out=scratch)
+        np.add(scratch, self.premultiplied[oy:oy + h, ox:ox + w], out=scratch)
+        np.right_shift(scratch, 8, out=scratch)
+        np.copyto(region, scratch, casting="unsafe")
+
+
+def render_text(text, font, font_size, color):
+    """
+    Renders text once with MoviePy/ImageMagick, as the MoviePy engine does.
+
+    Returns:
+        tuple: (rgb uint8 array, alpha float array in 0..1)
+    """
+    clip = TextClip(text, fontsize=font_size, color=color, font=font)
+    try:
+        rgb = np.ascontiguousarray(clip.get_frame(0)[:, :, :3], dtype=np.uint8)
+        alpha = clip.mask.get_frame(0) if clip.mask is not None else np.ones(rgb.shape[:2])
+    finally:
+        clip.close()
+    return rgb, alpha
+
+
+def resolve_position(position, overlay_size, frame_size):
+    """
+    Converts a MoviePy-style position (("left", "top"), (x, y), ...) to pixels.
+    """
+    (width, height), (frame_width, frame_height) = overlay_size, frame_size
+    horizontal, vertical = position
+
+    def axis(value, size, frame_extent, low, high):
+        if value == low:
+            return 0
+        if value == high:
+            return frame_extent - size
+        if value == "center":
+            return (frame_extent - size) // 2
+        return int(value)
+
+    return (
+        axis(horizontal, width, frame_width, "left", "right"),
+        axis(vertical, height, frame_height, "top", "bottom"),
+    )
+
+
+class TimestampOverlay:
+    """
+    Draws HH:MM:SS by blitting pre-rendered glyphs, so a new second costs
+    a few in-place blends instead of an ImageMagick render.
+    """
+
+    def __init__(self, font, font_size, color, position, frame_size):
+        self.glyphs = {
+            glyph: Overlay(*render_text(glyph, font, font_size, color))
+            for glyph in TIMESTAMP_GLYPHS
+        }
+        sample = "00:00:00"
+        width = sum(self.glyphs[glyph].width for glyph in sample)
+        height = max(self.glyphs[glyph].height for glyph in sample)
+        self.x, self.y = resolve_position(position, (width, height), frame_size)
+        self.height = height
+
+    def blend_into(self, frame, second):
+        x = self.x
+        text = f"{second // 3600:02}:{(second % 3600) // 60:02}:{second % 60:02}"
+        for glyph in text:
+            overlay = self.glyphs[glyph]
+            overlay.blend_into(frame, x, self.y + self.height - overlay.height)
+            x += overlay.width
+
+
+def probe_video(input_video_path):
+    """
+    Returns (width, height, fps) of the first video stream, as displayed.
+    """
+    infos = ffmpeg_parse_infos(input_video_path)
+    if not infos.get("video_found"):
+        raise ValueError(f"No video stream found in {input_video_path}")
+    width, height = infos["video_size"]
+    # ffmpeg applies rotation metadata when decoding
+    if infos.get("video_rotation") in (90, 270):
+        width, height = height, width
+    return width, height, infos["video_fps"]
+
+
+def _read_frames(stdout, buffers, free_slots, filled_slots):
+    """
+    Fills free ring slots from the decoder with readinto; None marks the end.
+    """
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    frame_bytes = len(views[0])
+    try:
+        while True:
+            slot = free_slots.get()
+            view = views[slot]
+            filled = 0
+            while filled < frame_bytes:
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            if filled < frame_bytes:
+                break
+            filled_slots.put(slot)
+    finally:
+        filled_slots.put(None)
+
+
+def add_watermark_rawpipe(params, watermarked_video_path, video_codec):
+    """
+    Watermarks a video through raw ffmpeg pipes with preallocated frame buffers.
+
+    Args:
+        params (dict): The add_watermark params (input_video_path, username,
+            video_date, font, font_size, colors and positions).
+        watermarked_video_path (str): Output path.
+        video_codec (str): ffmpeg video encoder, e.g. 'libx264'.
+
+    Returns:
+        str: The output path.
+    """
+    input_video_path = params["input_video_path"]
+    width, height, fps = probe_video(input_video_path)
+    frame_size = (width, height)
+    font, font_size = params["font"], params["font_size"]
+
+    static_overlays = []
+    for text, color, position in (
+        (params["username"], params["username_color"], params["username_position"]),
+        (params["video_date"], params["date_color"], params["date_position"]),
+    ):
+        overlay = Overlay(*render_text(text, font, font_size, color))
+        static_overlays.append(
+            (overlay, *resolve_position(position, (overlay.width, overlay.height), frame_size))
+        )
+    timestamp = TimestampOverlay(
+        font, font_size, params["timestamp_color"], params["timestamp_position"], frame_size
+    )
+
+    ffmpeg = get_ffmpeg_exe()
+    profiler = profiler1.active()
+    if profiler is not None:
+        # -benchmark reports at info level; stderr goes to files so a full
+        # pipe can never stall ffmpeg
+        log_args = ["-v", "info", "-hide_banner", "-nostats", "-benchmark"]
+        decoder_log = tempfile.TemporaryFile(mode="w+")
+        encoder_log = tempfile.TemporaryFile(mode="w+")
+    else:
+        log_args = ["-v", "error"]
+        decoder_log = encoder_log = None
+
+    decoder = subprocess.Popen(
+        [ffmpeg, *log_args, "-i", input_video_path,
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+        stdout=subprocess.PIPE,
+        stderr=decoder_log,
+        bufsize=0,
+    )
+    encoder_command = [
+        ffmpeg, *log_args, "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps}",
+        "-i", "pipe:0",
+        "-i", input_video_path,
+        "-map", "0:v", "-map", "1:a?",
+        "-c:v", video_codec, "-pix_fmt", "yuv420p",
+        # Output keeps the input container, so the audio can be copied as is
+        "-c:a", "copy",
+    ]
+    if video_codec == "libx264":
+        encoder_command += ["-preset", params.get("x264_preset", "medium")]
+    encoder_command.append(watermarked_video_path)
+    encoder = subprocess.Popen(
+        encoder_command, stdin=subprocess.PIPE, stderr=encoder_log, bufsize=0
+    )
+
+    buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(RING_SIZE)]
+    free_slots, filled_slots = queue.Queue(), queue.Queue()
+    for slot in range(RING_SIZE):
+        free_slots.put(slot)
+    reader = threading.Thread(
+        target=_read_frames,
+        args=(decoder.stdout, buffers, free_slots, filled_slots),
+        name="rawpipe-reader",
+        daemon=True,
+    )
+    reader.start()
+
+    frame_index = 0
+    try:
+        while True:
+            slot = filled_slots.get()
+            if slot is None:
+                break
+            frame = buffers[slot]
+            for overlay, x, y in static_overlays:
+                overlay.blend_into(frame, x, y)
+            timestamp.blend_into(frame, int(frame_index / fps))
+            encoder.stdin.write(memoryview(frame).cast("B"))
+            free_slots.put(slot)
+            frame_index += 1
+    except Exception:
+        logger.debug(traceback.format_exc())
+        decoder.kill()
+        # Unblock the reader so it sees the closed pipe and exits
+        for slot in range(RING_SIZE):
+            free_slots.put(slot)
+        raise
+    finally:
+        encoder.stdin.close()
+        reader.join()
+        decoder.wait()
+        encoder.wait()
+
+    if profiler is not None:
+        for name, log in (("ffmpeg_decode_benchmark", decoder_log), ("ffmpeg_encode_benchmark", encoder_log)):
+            log.seek(0)
+            profiler.add_note(name, profiler1.parse_ffmpeg_benchmark(log.read()))
+            log.close()
+        profiler.add_note("frames", frame_index)
+
+    if decoder.returncode or encoder.returncode:
+        raise RuntimeError(
+            f"ffmpeg failed (decoder {decoder.returncode}, encoder {encoder.returncode})"
+        )
+    logger.info(f"Encoded {frame_index} frames through raw pipes to {watermarked_video_path}")
+    return watermarked_video_path
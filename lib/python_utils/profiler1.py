@@ -0,0 +1,234 @@
+# profiler1.py
+# opt-in, low-overhead sampling profiler for jobs
+# a background thread samples every thread's stack; output is a
+# collapsed-stack file (flamegraph.pl / speedscope) plus a JSON summary
+# written next to the job's sidecar
+
+import collections
+import contextlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+PROFILE_ENV = "FROBNITZ_PROFILE"
+DEFAULT_INTERVAL = 0.01
+TOP_FRAMES = 25
+
+# The profiler of the job running in each thread, so deeper code (ffmpeg
+# calls) can report to it; parallel sync entries each have their own
+_active = threading.local()
+
+
+def profiling_enabled(config):
+    """
+    Returns True if profiling is switched on by FROBNITZ_PROFILE or the
+    'profiling' config section.
+
+    Args:
+        config (dict): App config or params, may contain 'profiling'.
+    """
+    env = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if env:
+        return env not in ("0", "false", "no", "off")
+    return bool((config.get("profiling") or {}).get("enabled"))
+
+
+def active():
+    """
+    Returns the profiler of the calling thread's job, or None when profiling is off.
+    """
+    return getattr(_active, "profiler", None)
+
+
+def start_if_enabled(config, threads=None):
+    """
+    Starts a profiler for a job if profiling is enabled.
+
+    Args:
+        config (dict): App config or params, may contain 'profiling'.
+        threads (set): Thread idents to sample; None samples every thread.
+
+    Returns:
+        SamplingProfiler: The started profiler, or None.
+    """
+    if not profiling_enabled(config):
+        return None
+    interval = (config.get("profiling") or {}).get("interval", DEFAULT_INTERVAL)
+    return SamplingProfiler(interval, threads).start()
+
+
+def stage(profiler, name):
+    """
+    Returns profiler.stage(name), or a no-op context when profiler is None.
+    """
+    return profiler.stage(name) if profiler is not None else contextlib.nullcontext()
+
+
+def finish(profiler, video_path, label):
+    """
+    Stops a job's profiler and writes its report next to video_path.
+    Reporting errors are logged, never raised into the job.
+
+    Args:
+        profiler (SamplingProfiler): The job's profiler, may be None.
+        video_path (str): The job's video; the report shares its base name.
+        label (str): Which entry point ran the job, e.g. 'download'.
+
+    Returns:
+        dict: The report paths, or None.
+    """
+    if profiler is None:
+        return None
+    profiler.stop()
+    if not video_path:
+        return None
+    try:
+        return profiler.write_report(os.path.splitext(video_path)[0], label)
+    except Exception as e:
+        logger.error(f"Failed to write profile report for {video_path}: {e}")
+        return None
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads (or only the given ones) at a
+    fixed interval and attributes each sample to the current job stage.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, threads=None):
+        self.interval = interval
+        self.threads = threads
+        self.samples = collections.Counter()
+        self.stage_times = collections.OrderedDict()
+        self.notes = {}
+        self.current_stage = "setup"
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        _active.profiler = self
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if active() is self:
+            _active.profiler = None
+        self.notes["wall_seconds"] = round(time.perf_counter() - self._started_at, 3)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.threads is not None and thread_id not in self.threads):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.append(self.current_stage)
+                self.samples[";".join(reversed(stack))] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Attributes samples and wall time inside the block to stage name.
+        """
+        previous, self.current_stage = self.current_stage, name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_times[name] = round(self.stage_times.get(name, 0) + elapsed, 3)
+            self.current_stage = previous
+
+    def add_note(self, key, value):
+        """
+        Attaches extra data (e.g. ffmpeg benchmark stats) to the summary.
+        """
+        self.notes[key] = value
+
+    def summary(self):
+        """
+        Returns stage wall times, sample counts and the hottest leaf frames.
+        """
+        total = sum(self.samples.values())
+        leaves = collections.Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "interval": self.interval,
+            "samples": total,
+            "stages": dict(self.stage_times),
+            "top_frames": [
+                {"frame": frame, "samples": count, "percent": round(100 * count / total, 1)}
+                for frame, count in leaves.most_common(TOP_FRAMES)
+            ] if total else [],
+            **self.notes,
+        }
+
+    def write_report(self, base_path, label=None):
+        """
+        Writes <base>.<label>.profile.folded and <base>.<label>.profile.json,
+        so reports of different entry points for one video don't overwrite
+        each other.
+
+        Args:
+            base_path (str): Job output path without extension (the sidecar's base).
+            label (str): Entry point, e.g. 'download' or 'watermark'; omitted if None.
+
+        Returns:
+            dict: Paths under 'profile_folded' and 'profile_summary'.
+        """
+        import utilities1
+
+        if label:
+            base_path = f"{base_path}.{label}"
+        folded_path = f"{base_path}.profile.folded"
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        summary_path = utilities1.write_json_atomic(
+            f"{base_path}.profile.json", self.summary(), encoding="pretty"
+        )
+        logger.info(f"Profile written to {folded_path} and {summary_path}")
+        return {"profile_folded": folded_path, "profile_summary": summary_path}
+
+
+def parse_ffmpeg_benchmark(stderr_text):
+    """
+    Extracts the 'bench:' lines ffmpeg prints with -benchmark.
+
+    Returns:
+        dict: e.g. {"utime": "12.3s", "stime": "0.4s", "rtime": "9.8s", "maxrss": "215040KiB"}
+    """
+    stats = {}
+    for line in stderr_text.splitlines():
+        if line.startswith("bench:"):
+            stats.update(re.findall(r"(\w+)=(\S+)", line))
+    return stats
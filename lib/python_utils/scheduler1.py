@@ -0,0 +1,510 @@
+# scheduler1.py
+# persistent job queue for the download and watermark stages
+# SQLite-backed: priorities, retry with exponential backoff + jitter,
+# params checkpointed after every stage so a restarted worker resumes
+# running jobs hold a lease renewed by a heartbeat; only expired leases
+# are taken back
+
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+SCHEDULER_FILENAME = "frobnitz_jobs.sqlite3"
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_SCHEDULER_CONFIG = {
+    "max_attempts": 5,
+    "backoff_base": 30,
+    "backoff_cap": 1800,
+    "poll_interval": 5,
+    "lease_seconds": 300,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    stage_index INTEGER NOT NULL DEFAULT 0,
+    watermark INTEGER NOT NULL DEFAULT 1,
+    params TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    worker_id TEXT,
+    lease_expires_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (state, priority DESC, next_attempt_at);
+"""
+
+# Columns added after the first release, created on databases that predate them
+MIGRATIONS = {
+    "worker_id": "ALTER TABLE jobs ADD COLUMN worker_id TEXT",
+    "lease_expires_at": "ALTER TABLE jobs ADD COLUMN lease_expires_at REAL NOT NULL DEFAULT 0",
+}
+
+
+def watermark_video(params):
+    """
+    Watermarks the downloaded video with the settings carried in params.
+
+    Args:
+        params (dict): Job params including 'to_process' and the watermark_config keys.
+
+    Returns:
+        dict: A dictionary with the watermarked path under 'watermarked', or None if it fails.
+    """
+    # Imported lazily: MoviePy is heavy and only this stage needs it
+    import watermarker2
+
+    watermark_params = dict(params)
+    watermark_params.update(
+        {
+            "input_video_path": params.get("to_process"),
+            "username": params.get("user_id", "DefaultUser"),
+            "video_date": params.get("video_date", "Date"),
+            "font": params.get("font", "Arial-Bold"),
+            "font_size": params.get("font_size", 48),
+            "username_color": params.get("username_color", "yellow"),
+            "date_color": params.get("date_color", "cyan"),
+            "timestamp_color": params.get("timestamp_color", "red"),
+            "username_position": tuple(params.get("username_position", ["left", "top"])),
+            "date_position": tuple(params.get("date_position", ["left", "bottom"])),
+            "timestamp_position": tuple(params.get("timestamp_position", ["right", "bottom"])),
+        }
+    )
+    result = watermarker2.add_watermark(watermark_params)
+    if not result:
+        return None
+    return {"watermarked": result["to_process"]}
+
+
+def get_stages(watermark=True):
+    """
+    Returns the pipeline stages as (name, function, required) tuples.
+    A required stage that returns a falsy result fails the attempt.
+
+    Args:
+        watermark (bool): Whether to include the watermark stage.
+
+    Returns:
+        list: The ordered stages.
+    """
+    import downloader5
+    import fetcher1
+    import formats1
+    import staging1
+    import utilities1
+
+    stages = [
+        ("mask_metadata", downloader5.mask_metadata, True),
+        ("plan_format", formats1.plan_format, False),
+        ("admit_job", staging1.admit_job, True),
+        ("stage_download_path", staging1.stage_download_path, False),
+        ("create_original_filename", downloader5.create_original_filename, True),
+        ("start_auxiliary_download", fetcher1.start_auxiliary_download, False),
+        ("download_video", downloader5.download_video, True),
+        ("collect_auxiliary_download", fetcher1.collect_auxiliary_download, False),
+    ]
+    if watermark:
+        stages.append(("watermark_video", watermark_video, True))
+    stages += [
+        ("transfer_to_target", staging1.transfer_to_target, True),
+        ("await_transfers", staging1.await_transfers, True),
+        ("store_params_as_json", utilities1.store_params_as_json, False),
+    ]
+    return stages
+
+
+def connect(db_path):
+    """
+    Opens the job database, creating the schema if needed.
+
+    Args:
+        db_path (str): Path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: An open connection with rows as sqlite3.Row.
+    """
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+    for column, statement in MIGRATIONS.items():
+        if column not in columns:
+            connection.execute(statement)
+    return connection
+
+
+def new_worker_id():
+    """
+    Returns an id unique to this worker process: host, pid and a random suffix.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue_job(db_path, params, priority=0, watermark=True):
+    """
+    Adds a job to the queue.
+
+    Args:
+        db_path (str): Path of the job database.
+        params (dict): Initial job params; must contain 'url'.
+        priority (int): Higher priorities run first.
+        watermark (bool): Whether the job runs the watermark stage.
+
+    Returns:
+        int: The new job id.
+    """
+    if not params.get("url"):
+        raise ValueError("Missing required parameter: 'url'")
+    now = time.time()
+    connection = connect(db_path)
+    try:
+        cursor = connection.execute(
+            "INSERT INTO jobs (url, priority, watermark, params, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (params["url"], priority, int(watermark), json.dumps(params), now, now),
+        )
+        logger.info(f"Enqueued job {cursor.lastrowid} for {params['url']} (priority {priority})")
+        return cursor.lastrowid
+    finally:
+        connection.close()
+
+
+def recover_jobs(connection):
+    """
+    Requeues 'running' jobs whose lease has expired, i.e. whose worker died
+    or stopped sending heartbeats. They resume at their last checkpointed
+    stage; jobs held by live workers are left alone.
+
+    Returns:
+        int: Number of jobs requeued.
+    """
+    now = time.time()
+    cursor = connection.execute(
+        "UPDATE jobs SET state = ?, worker_id = NULL, updated_at = ? "
+        "WHERE state = ? AND lease_expires_at < ?",
+        (QUEUED, now, RUNNING, now),
+    )
+    if cursor.rowcount:
+        logger.warning(f"Requeued {cursor.rowcount} interrupted job(s)")
+    return cursor.rowcount
+
+
+def renew_lease(connection, job_id, worker_id, lease_seconds):
+    """
+    Extends the lease of a job held by worker_id.
+
+    Returns:
+        bool: False if the job is no longer held by this worker.
+    """
+    cursor = connection.execute(
+        "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND state = ? AND worker_id = ?",
+        (time.time() + lease_seconds, job_id, RUNNING, worker_id),
+    )
+    return cursor.rowcount == 1
+
+
+def _heartbeat(db_path, job_id, worker_id, lease_seconds, stop, lease_lost):
+    """
+    Renews a job's lease every third of the lease until stop is set, so a
+    long stage (a download, an encode) does not let the lease run out.
+    Sets lease_lost if another worker has taken the job over.
+    """
+    connection = connect(db_path)
+    try:
+        while not stop.wait(lease_seconds / 3):
+            try:
+                if not renew_lease(connection, job_id, worker_id, lease_seconds):
+                    logger.warning(f"Job {job_id}: lease lost by worker {worker_id}")
+                    lease_lost.set()
+                    return
+            except sqlite3.Error as e:
+                logger.warning(f"Job {job_id}: failed to renew lease: {e}")
+    finally:
+        connection.close()
+
+
+def claim_next_job(connection, worker_id, lease_seconds):
+    """
+    Atomically marks the highest-priority ready job as running under
+    worker_id, with a lease of lease_seconds.
+
+    Returns:
+        sqlite3.Row: The claimed job as updated, or None if no job is ready.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        job = connection.execute(
+            "SELECT * FROM jobs WHERE state = ? AND next_attempt_at <= ? "
+            "ORDER BY priority DESC, id LIMIT 1",
+            (QUEUED, time.time()),
+        ).fetchone()
+        if job is not None:
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET state = ?, worker_id = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now + lease_seconds, now, job["id"]),
+            )
+            job = connection.execute("SELECT * FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+        connection.execute("COMMIT")
+        return job
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def backoff_delay(attempts, base, cap):
+    """
+    Exponential backoff with jitter: half the delay is fixed, half random.
+
+    Args:
+        attempts (int): Failed attempts so far (1 for the first retry).
+        base (float): Delay in seconds for the first retry.
+        cap (float): Maximum delay in seconds.
+
+    Returns:
+        float: Seconds to wait before the next attempt.
+    """
+    delay = min(cap, base * (2 ** (attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def run_job(connection, job, scheduler_config, lease_lost=None):
+    """
+    Runs a claimed job from its checkpointed stage, saving params and
+    renewing the lease after each completed stage. A failing required
+    stage schedules a retry. With profiling on, the attempt is profiled
+    into <base>.job.profile.*.
+
+    Every write is fenced on the claiming worker, so a worker whose lease
+    was taken over stops between stages instead of overwriting the new
+    holder's progress.
+
+    Args:
+        connection (sqlite3.Connection): Open job database connection.
+        job (sqlite3.Row): The job as returned by claim_next_job.
+        scheduler_config (dict): Effective scheduler configuration.
+        lease_lost (threading.Event): Set by the heartbeat when the lease is lost.
+
+    Returns:
+        str: The job's new state, or None if the lease was lost.
+    """
+    import profiler1
+
+    params = json.loads(job["params"])
+    stages = get_stages(bool(job["watermark"]))
+    stage_index = job["stage_index"]
+
+    profiler = profiler1.start_if_enabled(params)
+    try:
+        while stage_index < len(stages):
+            if lease_lost is not None and lease_lost.is_set():
+                logger.warning(f"Job {job['id']}: lease lost, abandoning attempt")
+                return None
+            name, func, required = stages[stage_index]
+            logger.info(f"Job {job['id']}: entering stage {name}")
+            try:
+                with profiler1.stage(profiler, name):
+                    result = func(params)
+                if required and not result:
+                    raise RuntimeError(f"Stage {name} returned no result")
+            except Exception as e:
+                logger.error(f"Job {job['id']}: stage {name} failed: {e}")
+                logger.debug(traceback.format_exc())
+                return fail_job(connection, job, params, stage_index, f"{name}: {e}", scheduler_config)
+
+            if result:
+                params.update(result)
+            stage_index += 1
+            now = time.time()
+            cursor = connection.execute(
+                "UPDATE jobs SET params = ?, stage_index = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND state = ? AND worker_id = ?",
+                (json.dumps(params), stage_index, now + scheduler_config["lease_seconds"], now,
+                 job["id"], RUNNING, job["worker_id"]),
+            )
+            if cursor.rowcount == 0:
+                logger.warning(f"Job {job['id']}: lease lost, abandoning attempt")
+                return None
+    finally:
+        profiler1.finish(profiler, params.get("original_filename"), "job")
+
+    cursor = connection.execute(
+        "UPDATE jobs SET state = ?, worker_id = NULL, last_error = NULL, updated_at = ? "
+        "WHERE id = ? AND state = ? AND worker_id = ?",
+        (DONE, time.time(), job["id"], RUNNING, job["worker_id"]),
+    )
+    if cursor.rowcount == 0:
+        logger.warning(f"Job {job['id']}: lease lost before it could be marked done")
+        return None
+    logger.info(f"Job {job['id']} done")
+    if params.get("archive_path") and params.get("archive_key"):
+        # Jobs queued by a sync are archived so the next sync skips them
+        import sync1
+
+        sync1.record_in_archive(params["archive_path"], params["archive_key"])
+    return DONE
+
+
+def fail_job(connection, job, params, stage_index, error, scheduler_config):
+    """
+    Records a failed attempt and either schedules a retry or marks the job failed.
+
+    Returns:
+        str: The job's new state, or None if the lease was lost.
+    """
+    attempts = job["attempts"] + 1
+    if attempts >= scheduler_config["max_attempts"]:
+        state, next_attempt_at = FAILED, 0
+        logger.error(f"Job {job['id']} failed after {attempts} attempt(s): {error}")
+    else:
+        delay = backoff_delay(
+            attempts, scheduler_config["backoff_base"], scheduler_config["backoff_cap"]
+        )
+        state, next_attempt_at = QUEUED, time.time() + delay
+        logger.warning(f"Job {job['id']} will retry in {delay:.0f}s (attempt {attempts})")
+    cursor = connection.execute(
+        "UPDATE jobs SET state = ?, worker_id = NULL, attempts = ?, next_attempt_at = ?, "
+        "last_error = ?, params = ?, stage_index = ?, updated_at = ? "
+        "WHERE id = ? AND state = ? AND worker_id = ?",
+        (state, attempts, next_attempt_at, error, json.dumps(params), stage_index, time.time(),
+         job["id"], RUNNING, job["worker_id"]),
+    )
+    if cursor.rowcount == 0:
+        logger.warning(f"Job {job['id']}: lease lost, failed attempt not recorded")
+        return None
+    return state
+
+
+def run_worker(db_path, scheduler_config=None, once=False, staging_config=None):
+    """
+    Processes queued jobs until the queue is drained (once=True) or forever.
+
+    Args:
+        db_path (str): Path of the job database.
+        scheduler_config (dict): Overrides for DEFAULT_SCHEDULER_CONFIG.
+        once (bool): Return when no job is ready instead of polling.
+        staging_config (dict): The 'staging' config, used to resume interrupted transfers.
+
+    Returns:
+        int: Number of jobs processed.
+    """
+    import downloader5
+    import staging1
+
+    config = dict(DEFAULT_SCHEDULER_CONFIG)
+    config.update(scheduler_config or {})
+    processed = 0
+    worker_id = new_worker_id()
+    logger.info(f"Worker {worker_id} starting")
+    connection = connect(db_path)
+    try:
+        recover_jobs(connection)
+        staging1.recover_transfers({"staging": staging_config or {}})
+        while True:
+            job = claim_next_job(connection, worker_id, config["lease_seconds"])
+            if job is None:
+                if once:
+                    return processed
+                time.sleep(config["poll_interval"])
+                # Pick up jobs of workers that died while this one was running
+                recover_jobs(connection)
+                continue
+            stop, lease_lost = threading.Event(), threading.Event()
+            heartbeat = threading.Thread(
+                target=_heartbeat,
+                args=(db_path, job["id"], worker_id, config["lease_seconds"], stop, lease_lost),
+                name=f"heartbeat-{job['id']}",
+                daemon=True,
+            )
+            heartbeat.start()
+            try:
+                run_job(connection, job, config, lease_lost)
+            finally:
+                stop.set()
+                heartbeat.join()
+            downloader5.clear_cached_metadata(job["url"])
+            processed += 1
+    finally:
+        connection.close()
+        # Finish moving staged files before the process exits
+        for failure in staging1.wait_for_transfers():
+            logger.error(f"Transfer of {failure['src']} to {failure['dst']} failed: {failure['error']}")
+
+
+def pending_urls(db_path):
+    """
+    Returns the URLs of jobs that are queued or running.
+
+    Args:
+        db_path (str): Path of the job database.
+
+    Returns:
+        set: URLs of unfinished jobs.
+    """
+    connection = connect(db_path)
+    try:
+        return {
+            row["url"]
+            for row in connection.execute(
+                "SELECT url FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)
+            )
+        }
+    finally:
+        connection.close()
+
+
+def list_jobs(db_path, state=None):
+    """
+    Returns jobs, optionally filtered by state, highest priority first.
+
+    Args:
+        db_path (str): Path of the job database.
+        state (str): Only return jobs in this state.
+
+    Returns:
+        list: Jobs as dictionaries, without their params.
+    """
+    sql = ("SELECT id, url, priority, state, stage_index, attempts, next_attempt_at, last_error, "
+           "worker_id FROM jobs")
+    args = []
+    if state:
+        sql += " WHERE state = ?"
+        args.append(state)
+    sql += " ORDER BY priority DESC, id"
+    connection = connect(db_path)
+    try:
+        return [dict(row) for row in connection.execute(sql, args)]
+    finally:
+        connection.close()
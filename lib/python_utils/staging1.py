@@ -0,0 +1,444 @@
+# staging1.py
+# download/merge/encode on fast local scratch, then move finished files
+# to the USB target with sequential copies in a background thread
+# free space on both sides is checked before a job is admitted
+# each transfer's manifest stays flock()ed by the process that owns it, so
+# another worker only takes over manifests whose owner has died
+
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import traceback
+import uuid
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+DEFAULT_STAGING_CONFIG = {
+    "enabled": False,
+    "scratch_path": "/tmp/frobnitz_scratch",
+    # download + merge + watermarked encode can coexist on scratch
+    "scratch_margin": 3.0,
+    # original + watermarked copy end up on the target
+    "target_margin": 2.0,
+    # assumed size when metadata has neither filesize nor tbr
+    "default_job_size": 1024 * 1024 * 1024,
+    "copy_buffer_size": 8 * 1024 * 1024,
+}
+
+# params keys holding a single artifact path
+ARTIFACT_KEYS = ["original_filename", "to_process", "watermarked"]
+
+TRANSFER_DIR = ".transfers"
+
+
+class InsufficientSpaceError(OSError):
+    """Raised when scratch or target lacks the free space a job needs."""
+
+
+_transfer_queue = queue.Queue()
+_transfer_thread = None
+_transfer_lock = threading.Lock()
+# Bytes queued for the target but not yet copied
+_pending_bytes = 0
+# Transfers queued by this process, by destination; failed ones are kept
+# until a retry requeues them
+_transfers = {}
+
+
+def get_staging_config(params):
+    """
+    Merges the 'staging' section of params over the defaults.
+
+    Args:
+        params (dict): The input dictionary, may contain 'staging'.
+
+    Returns:
+        dict: The effective staging configuration.
+    """
+    staging_config = dict(DEFAULT_STAGING_CONFIG)
+    staging_config.update(params.get("staging") or {})
+    return staging_config
+
+
+def estimate_job_size(params, staging_config):
+    """
+    Estimates the download size in bytes, from the planned format when
+    formats1.plan_format ran, otherwise from masked metadata.
+
+    Args:
+        params (dict): Params after mask_metadata (planned_filesize, filesize, tbr, duration).
+        staging_config (dict): Effective staging configuration.
+
+    Returns:
+        int: Estimated size in bytes.
+    """
+    if params.get("planned_filesize"):
+        return int(params["planned_filesize"])
+    if params.get("filesize"):
+        return int(params["filesize"])
+    if params.get("tbr") and params.get("duration"):
+        # tbr is in kbit/s
+        return int(params["tbr"] * 1000 / 8 * params["duration"])
+    return int(staging_config["default_job_size"])
+
+
+def _free_bytes(path):
+    """
+    Returns free bytes on the filesystem holding path (or its nearest existing parent).
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+
+def admit_job(params):
+    """
+    Checks that scratch (when staging) and target have room for the job.
+
+    Args:
+        params (dict): Params after mask_metadata.
+
+    Returns:
+        dict: A dictionary with the estimate under 'estimated_size'.
+
+    Raises:
+        InsufficientSpaceError: If either side is short of space.
+    """
+    staging_config = get_staging_config(params)
+    estimated_size = estimate_job_size(params, staging_config)
+    target_path = params.get("target_path", params.get("download_path"))
+
+    target_needed = int(estimated_size * staging_config["target_margin"]) + _pending_bytes
+    target_free = _free_bytes(target_path)
+    if target_free < target_needed:
+        raise InsufficientSpaceError(
+            f"Target {target_path} has {target_free} bytes free, job needs {target_needed}"
+        )
+
+    if staging_config["enabled"]:
+        scratch_path = staging_config["scratch_path"]
+        scratch_needed = int(estimated_size * staging_config["scratch_margin"])
+        scratch_free = _free_bytes(scratch_path)
+        if scratch_free < scratch_needed:
+            raise InsufficientSpaceError(
+                f"Scratch {scratch_path} has {scratch_free} bytes free, job needs {scratch_needed}"
+            )
+
+    logger.info(f"Job admitted, estimated size {estimated_size} bytes")
+    return {"estimated_size": estimated_size}
+
+
+def stage_download_path(params):
+    """
+    Points download_path at a scratch directory mirroring the target one.
+    The original download_path is kept under 'target_path'.
+
+    Args:
+        params (dict): Params including 'download_path'.
+
+    Returns:
+        dict: Updated 'download_path' and 'target_path', or None if staging is off.
+    """
+    staging_config = get_staging_config(params)
+    if not staging_config["enabled"] or params.get("target_path"):
+        return None
+    target_path = params["download_path"]
+    scratch_dir = os.path.join(
+        staging_config["scratch_path"], os.path.basename(os.path.normpath(target_path))
+    )
+    os.makedirs(scratch_dir, exist_ok=True)
+    logger.info(f"Staging {target_path} on scratch {scratch_dir}")
+    return {"download_path": scratch_dir, "target_path": target_path}
+
+
+def _copy_file(src, dst, buffer_size):
+    """
+    Copies src to dst in large sequential chunks, via a .part file that is
+    fsynced and renamed into place, then removes src.
+    """
+    part_path = dst + ".part"
+    with open(src, "rb") as fsrc, open(part_path, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst, buffer_size)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    os.replace(part_path, dst)
+    try:
+        stat = os.stat(src)
+        os.utime(dst, (stat.st_atime, stat.st_mtime))
+    except OSError:
+        pass
+    os.remove(src)
+
+
+def _transfer_worker():
+    """
+    Copies queued files one at a time so the USB target only sees sequential writes.
+    """
+    global _pending_bytes
+    while True:
+        transfer, buffer_size, size = _transfer_queue.get()
+        src, dst, manifest_path = transfer["src"], transfer["dst"], transfer["manifest"]
+        try:
+            _copy_file(src, dst, buffer_size)
+            logger.info(f"Moved {src} to {dst}")
+            if manifest_path and os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            transfer["lock"].close()
+        except Exception as e:
+            # The manifest stays, and stays locked, so this process can retry
+            # the copy; after it exits another worker can take it over
+            transfer["error"] = str(e)
+            logger.error(f"Failed to move {src} to {dst}: {e}")
+            logger.debug(traceback.format_exc())
+        finally:
+            with _transfer_lock:
+                _pending_bytes -= size
+            transfer["done"].set()
+            _transfer_queue.task_done()
+
+
+def _create_manifest(manifest_dir, src, dst):
+    """
+    Writes a locked transfer manifest. It is locked under a temporary name
+    and then renamed, so recover_transfers never sees it unlocked.
+
+    Returns:
+        tuple: (manifest path, open manifest file holding the lock)
+    """
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, f"{uuid.uuid4().hex}.json")
+    lock = open(manifest_path + ".tmp", "w", encoding="utf-8")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        json.dump({"src": src, "dst": dst, "pid": os.getpid()}, lock)
+        lock.flush()
+        os.replace(manifest_path + ".tmp", manifest_path)
+    except Exception:
+        lock.close()
+        raise
+    return manifest_path, lock
+
+
+def queue_transfer(src, dst, scratch_path, buffer_size=DEFAULT_STAGING_CONFIG["copy_buffer_size"],
+                   manifest_path=None, manifest_lock=None):
+    """
+    Queues a scratch file for the background copier, recording a manifest
+    so an interrupted copy can be resumed by recover_transfers.
+
+    Args:
+        src (str): File on scratch.
+        dst (str): Destination path on the target.
+        scratch_path (str): Scratch root holding the transfer manifests.
+        buffer_size (int): Copy chunk size in bytes.
+        manifest_path (str): Existing manifest of a transfer being retried or taken over.
+        manifest_lock (file): Open manifest holding its lock, given with manifest_path.
+    """
+    global _transfer_thread, _pending_bytes
+    if manifest_path is None:
+        manifest_path, manifest_lock = _create_manifest(
+            os.path.join(scratch_path, TRANSFER_DIR), src, dst
+        )
+
+    transfer = {
+        "src": src,
+        "dst": dst,
+        "manifest": manifest_path,
+        "lock": manifest_lock,
+        "done": threading.Event(),
+        "error": None,
+        "reported": False,
+    }
+    size = os.path.getsize(src)
+    with _transfer_lock:
+        _pending_bytes += size
+        _transfers[dst] = transfer
+        if _transfer_thread is None:
+            _transfer_thread = threading.Thread(
+                target=_transfer_worker, name="staging-transfer", daemon=True
+            )
+            _transfer_thread.start()
+    _transfer_queue.put((transfer, buffer_size, size))
+
+
+def transfer_to_target(params):
+    """
+    Queues the job's finished artifacts on scratch for transfer to the target
+    and rewrites their paths in params to the target locations.
+
+    Args:
+        params (dict): Params including 'target_path' from stage_download_path.
+
+    Returns:
+        dict: The rewritten paths, with 'download_path' restored and
+              'target_path' cleared, and the queued (src, dst) pairs under
+              'transfers' (empty if not staged).
+    """
+    target_path = params.get("target_path")
+    if not target_path:
+        return {"transfers": []}
+    staging_config = get_staging_config(params)
+    scratch_dir = params["download_path"]
+    os.makedirs(target_path, exist_ok=True)
+
+    moved = {}
+
+    def move(path):
+        if path in moved:
+            return moved[path]
+        if not path or not os.path.isfile(path):
+            return path
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(scratch_dir):
+            return path
+        dst = os.path.join(target_path, os.path.basename(path))
+        queue_transfer(path, dst, staging_config["scratch_path"], staging_config["copy_buffer_size"])
+        moved[path] = dst
+        return dst
+
+    updates = {"download_path": target_path}
+    for key in ARTIFACT_KEYS:
+        if params.get(key):
+            updates[key] = move(params[key])
+    assets = params.get("auxiliary_assets_saved")
+    if assets:
+        updates["auxiliary_assets_saved"] = {kind: move(path) for kind, path in assets.items()}
+
+    # Anything else the job wrote next to the video, skipping yt-dlp leftovers
+    if params.get("original_filename"):
+        base = os.path.splitext(params["original_filename"])[0]
+        for path in glob.glob(glob.escape(base) + ".*"):
+            if not path.endswith((".part", ".ytdl")):
+                move(path)
+
+    # The job is no longer staged; cleared so it doesn't linger in the sidecar
+    updates["target_path"] = None
+    updates["transfers"] = [[src, dst] for src, dst in moved.items()]
+    logger.info(f"Queued {len(moved)} file(s) for transfer to {target_path}")
+    return updates
+
+
+def await_transfers(params):
+    """
+    Waits for the transfers queued by transfer_to_target. Transfers that
+    failed on an earlier attempt are requeued first.
+
+    Args:
+        params (dict): Params including 'transfers' from transfer_to_target.
+
+    Returns:
+        dict: The number of files moved under 'transferred'.
+
+    Raises:
+        OSError: If any of the job's files could not be moved to the target.
+    """
+    staging_config = get_staging_config(params)
+    transfers = params.get("transfers") or []
+    for src, dst in transfers:
+        with _transfer_lock:
+            transfer = _transfers.get(dst)
+        if transfer is not None and transfer["reported"] and os.path.exists(transfer["src"]):
+            queue_transfer(
+                transfer["src"], dst, staging_config["scratch_path"],
+                staging_config["copy_buffer_size"], transfer["manifest"], transfer["lock"],
+            )
+
+    failures = wait_for_transfers([dst for _, dst in transfers])
+    if failures:
+        raise OSError(
+            f"{len(failures)} file(s) not moved to target: "
+            + "; ".join(f"{failure['dst']}: {failure['error']}" for failure in failures)
+        )
+    return {"transferred": len(transfers)}
+
+
+def recover_transfers(params):
+    """
+    Requeues transfers whose manifests survived an interrupted run. Manifests
+    still locked by a live worker are left to it.
+
+    Args:
+        params (dict): Params or config carrying the 'staging' section.
+
+    Returns:
+        int: Number of transfers requeued.
+    """
+    staging_config = get_staging_config(params)
+    manifest_dir = os.path.join(staging_config["scratch_path"], TRANSFER_DIR)
+    recovered = 0
+    for manifest_path in glob.glob(os.path.join(glob.escape(manifest_dir), "*.json")):
+        lock = None
+        try:
+            lock = open(manifest_path, "r", encoding="utf-8")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Owned by a live worker (or already queued by this process)
+                lock.close()
+                continue
+            manifest = json.load(lock)
+            if not os.path.exists(manifest["src"]):
+                os.remove(manifest_path)
+                lock.close()
+                continue
+            queue_transfer(
+                manifest["src"], manifest["dst"],
+                staging_config["scratch_path"], staging_config["copy_buffer_size"],
+                manifest_path, lock,
+            )
+            recovered += 1
+        except Exception as e:
+            if lock is not None:
+                lock.close()
+            logger.error(f"Failed to recover transfer {manifest_path}: {e}")
+            logger.debug(traceback.format_exc())
+    if recovered:
+        logger.warning(f"Requeued {recovered} interrupted transfer(s)")
+    return recovered
+
+
+def wait_for_transfers(destinations=None):
+    """
+    Blocks until the given transfers, or every queued transfer, have finished.
+
+    Args:
+        destinations (list): Destination paths to wait for; None waits for all.
+
+    Returns:
+        list: Failed transfers as dictionaries with 'src', 'dst' and 'error'.
+    """
+    if destinations is None:
+        _transfer_queue.join()
+        with _transfer_lock:
+            destinations = list(_transfers)
+
+    failures = []
+    for dst in destinations:
+        with _transfer_lock:
+            transfer = _transfers.get(dst)
+        if transfer is None:
+            continue
+        transfer["done"].wait()
+        if transfer["error"]:
+            transfer["reported"] = True
+            failures.append({key: transfer[key] for key in ("src", "dst", "error")})
+        else:
+            with _transfer_lock:
+                if _transfers.get(dst) is transfer:
+                    del _transfers[dst]
+    return failures
@@ -0,0 +1,318 @@
+# sync1.py
+# incremental playlist/channel mirroring
+# flat, lazy listing with yt-dlp, diffed against the download archive
+# and the catalog; only new entries go through the pipeline, in parallel
+# or as scheduler jobs that archive themselves when done
+
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+####################
+# Logger setup
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+###########################
+
+
+ARCHIVE_FILENAME = "frobnitz_archive.txt"
+
+DEFAULT_SYNC_CONFIG = {
+    "workers": 3,
+    # Stop listing a channel tab after this many consecutive already-archived
+    # entries; tabs list newest first, so a re-sync only pages through the
+    # delta. Playlists keep their own order and are always listed in full.
+    # 0 lists everything.
+    "stop_after_known": 50,
+    "max_depth": 2,
+}
+
+_archive_lock = threading.Lock()
+
+
+def get_sync_config(params):
+    """
+    Merges the 'sync' section of params over the defaults.
+
+    Args:
+        params (dict): The input dictionary, may contain 'sync'.
+
+    Returns:
+        dict: The effective sync configuration.
+    """
+    sync_config = dict(DEFAULT_SYNC_CONFIG)
+    sync_config.update(params.get("sync") or {})
+    return sync_config
+
+
+def archive_key(entry):
+    """
+    Returns the yt-dlp download-archive key ("<extractor> <id>") for an entry.
+    """
+    extractor = entry.get("ie_key") or entry.get("extractor_key") or "generic"
+    return f"{extractor.lower()} {entry['id']}"
+
+
+def load_archive(archive_path):
+    """
+    Reads a yt-dlp style download archive.
+
+    Args:
+        archive_path (str): Path of the archive file.
+
+    Returns:
+        set: Archive keys already downloaded.
+    """
+    if not archive_path or not os.path.exists(archive_path):
+        return set()
+    with open(archive_path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def record_in_archive(archive_path, key):
+    """
+    Appends a downloaded entry to the archive file.
+    """
+    with _archive_lock:
+        with open(archive_path, "a", encoding="utf-8") as f:
+            f.write(key + "\n")
+
+
+def known_video_ids(params):
+    """
+    Returns ids of videos the catalog holds a params sidecar for, i.e. that
+    finished the pipeline. Rows recorded by mask_metadata before a download
+    that then failed do not count.
+    """
+    import catalog1
+
+    catalog_path = catalog1.get_catalog_path(params)
+    if not catalog_path or not os.path.exists(catalog_path):
+        return set()
+    connection = catalog1.connect(catalog_path)
+    try:
+        return {
+            row[0]
+            for row in connection.execute("SELECT video_id FROM videos WHERE config_json IS NOT NULL")
+        }
+    finally:
+        connection.close()
+
+
+def is_channel_tab(info):
+    """
+    Returns True if a listing is a channel (tab), which lists newest first.
+    """
+    return bool(info.get("channel_id")) and info.get("id") == info.get("channel_id")
+
+
+def iter_entries(ydl, url, depth=0, max_depth=2, info=None):
+    """
+    Lazily yields flat video entries of a playlist or channel. Pages are
+    only fetched as the generator is consumed.
+
+    Args:
+        ydl (yt_dlp.YoutubeDL): A YoutubeDL set up for flat extraction.
+        url (str): Playlist or channel URL.
+        depth (int): Current nesting depth (channel -> tab -> video).
+        max_depth (int): Maximum nesting depth to follow.
+        info (dict): An already extracted (inline) playlist result for url.
+
+    Yields:
+        tuple: (listing, entry). entry is a flat entry with at least 'id' and
+               'url'; listing describes the playlist or tab it came from, and
+               setting listing['stop'] skips the rest of that listing.
+    """
+    if info is None:
+        info = ydl.extract_info(url, download=False, process=False)
+    listing = {"url": url, "newest_first": is_channel_tab(info), "known_streak": 0, "stop": False}
+    if info.get("_type") not in ("playlist", "multi_video"):
+        # A single video URL
+        yield listing, info
+        return
+
+    for entry in info.get("entries") or []:
+        if listing["stop"]:
+            break
+        if not entry:
+            continue
+        # Channel tabs and nested playlists come from the same extractor
+        # as their parent; videos come from a different one
+        nested = entry.get("_type") == "playlist" or (
+            entry.get("_type") == "url"
+            and entry.get("ie_key")
+            and entry.get("ie_key") == info.get("extractor_key")
+        )
+        if nested:
+            if depth >= max_depth:
+                continue
+            if entry.get("entries") is not None:
+                # Inline playlist result: its entries are already here
+                entry.setdefault("extractor_key", info.get("extractor_key"))
+                nested_url = entry.get("webpage_url") or entry.get("url") or f"{url}#{entry.get('id')}"
+                yield from iter_entries(ydl, nested_url, depth + 1, max_depth, info=entry)
+            elif entry.get("url"):
+                yield from iter_entries(ydl, entry["url"], depth + 1, max_depth)
+            continue
+        if entry.get("id"):
+            entry.setdefault("ie_key", info.get("extractor_key"))
+            yield listing, entry
+
+
+def list_new_entries(params):
+    """
+    Lists a playlist or channel and returns the entries not downloaded yet.
+
+    Args:
+        params (dict): Parameters including 'url', 'cookie_path', 'archive_path'
+            and the 'sync' configuration.
+
+    Returns:
+        list: New flat entries, in listing order.
+    """
+    sync_config = get_sync_config(params)
+    archive = load_archive(params.get("archive_path"))
+    catalog_ids = known_video_ids(params)
+    cookie_path = params.get("cookie_path")
+
+    ydl_opts = {
+        "cookiefile": cookie_path if cookie_path and os.path.exists(cookie_path) else None,
+        "extract_flat": "in_playlist",
+        "lazy_playlist": True,
+        "skip_download": True,
+        "quiet": True,
+    }
+
+    new_entries = []
+    seen = set()
+    stop_after_known = sync_config["stop_after_known"]
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for listing, entry in iter_entries(ydl, params["url"], max_depth=sync_config["max_depth"]):
+            key = archive_key(entry)
+            if key in seen:
+                continue
+            seen.add(key)
+            if key in archive or entry["id"] in catalog_ids:
+                # Each channel tab keeps its own streak, so a fully archived
+                # Videos tab doesn't hide new Shorts
+                listing["known_streak"] += 1
+                if (stop_after_known and listing["newest_first"]
+                        and listing["known_streak"] >= stop_after_known):
+                    logger.info(
+                        f"Reached {listing['known_streak']} known entries in a row, "
+                        f"skipping the rest of {listing['url']}"
+                    )
+                    listing["stop"] = True
+                continue
+            listing["known_streak"] = 0
+            new_entries.append(entry)
+
+    logger.info(f"Listed {len(seen)} entries, {len(new_entries)} new")
+    return new_entries
+
+
+def run_entry(params, entry, watermark=False):
+    """
+    Runs one new entry through the pipeline stages and archives it on success,
+    once its sidecars are on disk.
+
+    Args:
+        params (dict): Base params shared by the sync run.
+        entry (dict): Flat entry from list_new_entries.
+        watermark (bool): Whether to run the watermark stage.
+
+    Returns:
+        dict: The entry's final params, or None if a required stage failed.
+    """
+    import downloader5
+    import profiler1
+    import scheduler1
+    import utilities1
+
+    job_params = dict(params)
+    job_params["url"] = entry.get("webpage_url") or entry["url"]
+    sidecar_config = params.get("sidecar") or {}
+    if sidecar_config.get("batch_fsync"):
+        utilities1.begin_sidecar_batch()
+    # Entries run side by side; sample only this entry's thread so their
+    # stacks don't mix
+    threads = {threading.get_ident()} if get_sync_config(params)["workers"] > 1 else None
+    profiler = profiler1.start_if_enabled(params, threads)
+    try:
+        for name, func, required in scheduler1.get_stages(watermark):
+            try:
+                with profiler1.stage(profiler, name):
+                    result = func(job_params)
+                if required and not result:
+                    raise RuntimeError(f"Stage {name} returned no result")
+            except Exception as e:
+                logger.error(f"Sync of {job_params['url']} failed in {name}: {e}")
+                logger.debug(traceback.format_exc())
+                return None
+            if result:
+                job_params.update(result)
+    finally:
+        profiler1.finish(profiler, job_params.get("original_filename"), "job")
+        if sidecar_config.get("batch_fsync"):
+            utilities1.flush_sidecar_batch(fsync=sidecar_config.get("fsync", True))
+        # Info dicts are large; don't keep one per synced entry
+        downloader5.clear_cached_metadata(job_params["url"])
+
+    if params.get("archive_path"):
+        record_in_archive(params["archive_path"], archive_key(entry))
+    return job_params
+
+
+def sync_playlist(params, watermark=False, enqueue_db=None, priority=0):
+    """
+    Downloads the entries of a playlist or channel that are not archived yet.
+
+    Args:
+        params (dict): Download params including the playlist/channel 'url',
+            'archive_path' and the 'sync' configuration.
+        watermark (bool): Whether to run the watermark stage.
+        enqueue_db (str): Job database path; when set, new entries are queued
+            on the scheduler instead of being downloaded here.
+        priority (int): Priority for queued jobs.
+
+    Returns:
+        dict: Counts under 'new', 'downloaded' (or 'queued') and 'failed'.
+    """
+    import staging1
+
+    entries = list_new_entries(params)
+    if enqueue_db:
+        import scheduler1
+
+        # Entries queued by an earlier sync that haven't finished yet
+        pending_urls = scheduler1.pending_urls(enqueue_db)
+        queued = 0
+        for entry in entries:
+            url = entry.get("webpage_url") or entry["url"]
+            if url in pending_urls:
+                continue
+            # The job records archive_key in the archive when it completes
+            job_params = dict(params, url=url, archive_key=archive_key(entry))
+            scheduler1.enqueue_job(enqueue_db, job_params, priority=priority, watermark=watermark)
+            queued += 1
+        return {"new": len(entries), "queued": queued, "failed": 0}
+
+    sync_config = get_sync_config(params)
+    try:
+        with ThreadPoolExecutor(max_workers=sync_config["workers"]) as executor:
+            results = list(executor.map(lambda entry: run_entry(params, entry, watermark), entries))
+    finally:
+        staging1.wait_for_transfers()
+
+    downloaded = sum(1 for result in results if result)
+    return {"new": len(entries), "downloaded": downloaded, "failed": len(entries) - downloaded}
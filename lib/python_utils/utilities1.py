@@ -5,6 +5,16 @@ import time
 import traceback
 import logging
 import json
+import gzip
+import tempfile
+import threading
+
+import catalog1
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 ####################
@@ -19,12 +29,164 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 ###########################
 
+# Sidecar encodings: "pretty" (indent=4), "compact" (no whitespace) and
+# "gzip" (compact, gzip-compressed, written with a .gz suffix)
+SIDECAR_ENCODINGS = ("pretty", "compact", "gzip")
+
+# Temp files waiting to be fsynced and renamed by flush_sidecar_batch, per
+# thread, so parallel sync entries each commit only their own sidecars
+_sidecar_batch = threading.local()
+
+
+def encode_json(data, encoding="pretty"):
+    """
+    Serializes data to JSON bytes. Compact and gzip output use orjson when
+    it is installed; pretty output always uses json with indent=4 so
+    sidecars look the same on every host.
+
+    Args:
+        data: JSON-serializable data.
+        encoding (str): One of SIDECAR_ENCODINGS.
+
+    Returns:
+        bytes: The encoded document.
+    """
+    if encoding not in SIDECAR_ENCODINGS:
+        raise ValueError(f"Unknown sidecar encoding: {encoding}")
+    if orjson is not None and encoding != "pretty":
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson is strict about types json falls back to str() for
+            payload = None
+        if payload is not None:
+            return gzip.compress(payload, compresslevel=6) if encoding == "gzip" else payload
+    if encoding == "pretty":
+        text = json.dumps(data, indent=4, ensure_ascii=False, default=str)
+    else:
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+    payload = text.encode("utf-8")
+    return gzip.compress(payload, compresslevel=6) if encoding == "gzip" else payload
+
+
+def sidecar_path(path, encoding="pretty"):
+    """
+    Returns the on-disk path for a sidecar, adding .gz for gzip encoding.
+    """
+    return path + ".gz" if encoding == "gzip" else path
+
+
+def _fsync_dir(path):
+    """
+    Flushes directory entries (renames) to disk where the OS allows it.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # exFAT/FAT mounts and some platforms reject directory fsync
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path, data, encoding="pretty", fsync=True, batch=True):
+    """
+    Writes JSON to a temporary file in the target directory and renames it
+    over the final path, so readers never see a partially written file.
+
+    Inside a sidecar batch started by the calling thread, the fsync and
+    rename are deferred until flush_sidecar_batch, which syncs all pending
+    files together.
+
+    Args:
+        path (str): Final JSON path (".gz" is appended for gzip encoding).
+        data: JSON-serializable data.
+        encoding (str): One of SIDECAR_ENCODINGS.
+        fsync (bool): Whether to fsync the file before it is renamed.
+        batch (bool): Join an active sidecar batch; pass False for files
+            later stages need to find on disk straight away.
+
+    Returns:
+        str: The final path of the sidecar.
+    """
+    pending = getattr(_sidecar_batch, "pending", None) if batch else None
+    final_path = sidecar_path(path, encoding)
+    directory = os.path.dirname(os.path.abspath(final_path))
+    payload = encode_json(data, encoding)
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            if pending is None and fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if pending is not None:
+            pending.append((tmp_path, final_path))
+            return final_path
+        os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if fsync:
+        _fsync_dir(directory)
+    return final_path
+
+
+def begin_sidecar_batch():
+    """
+    Starts grouping the calling thread's sidecar writes so they are fsynced
+    and renamed together by flush_sidecar_batch instead of one synchronous
+    write at a time.
+    """
+    if getattr(_sidecar_batch, "pending", None) is None:
+        _sidecar_batch.pending = []
+
+
+def flush_sidecar_batch(fsync=True):
+    """
+    Fsyncs every sidecar pending in the calling thread's batch, renames them
+    into place and syncs each affected directory once.
+
+    Args:
+        fsync (bool): Whether to fsync files and directories.
+
+    Returns:
+        list: Final paths of the sidecars that were committed.
+    """
+    pending = getattr(_sidecar_batch, "pending", None) or []
+    _sidecar_batch.pending = None
+    if fsync:
+        for tmp_path, _ in pending:
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    directories = set()
+    for tmp_path, final_path in pending:
+        os.replace(tmp_path, final_path)
+        directories.add(os.path.dirname(os.path.abspath(final_path)))
+    if fsync:
+        for directory in directories:
+            _fsync_dir(directory)
+    logger.info(f"Flushed {len(pending)} sidecar file(s)")
+    return [final_path for _, final_path in pending]
+
 
 # Function to store params as a JSON file in the output directory
 def store_params_as_json(params):
     """
     Stores the params dictionary as a JSON file in the output directory.
     The filename should match the video file, but with a .json extension.
+    The 'sidecar' entry in params selects the encoding and fsync behaviour.
 
     Args:
         params (dict): The parameters dictionary to store.
@@ -35,10 +197,15 @@ def store_params_as_json(params):
     try:
         original_filename = params.get("original_filename")
         if original_filename:
-            json_filename = os.path.splitext(original_filename)[0] + ".json"
-            with open(json_filename, "w") as json_file:
-                json.dump(params, json_file, indent=4)
+            sidecar_config = params.get("sidecar") or {}
+            json_filename = write_json_atomic(
+                os.path.splitext(original_filename)[0] + ".json",
+                params,
+                encoding=sidecar_config.get("encoding", "pretty"),
+                fsync=sidecar_config.get("fsync", True),
+            )
             logger.info(f"Params saved to JSON file: {json_filename}")
+            catalog1.record_video(dict(params, config_json=json_filename))
             return {"config_json": json_filename}
         else:
             logger.warning("No original filename found in params to create JSON file.")
@@ -49,6 +216,38 @@ def store_params_as_json(params):
         return {"config_json": None}
 
 
+def build_download_params(config):
+    """
+    Builds the initial params dictionary for a download job from the app config.
+
+    Args:
+        config (dict): The loaded app config; 'download_path' must already be set.
+
+    Returns:
+        dict: Params with download, sidecar, catalog, profiling and watermark settings,
+              and 'url' unset.
+    """
+    return {
+        "download_path": config["download_path"],
+        "cookie_path": (
+            config.get("cookie_path")
+            if os.path.exists(os.path.expanduser(config.get("cookie_path", "")))
+            else None
+        ),
+        "url": None,
+        "video_download": config.get("video_download", {}),
+        "auxiliary_assets": config.get("auxiliary_assets", {}),
+        "sidecar": config.get("sidecar", {}),
+        "staging": config.get("staging", {}),
+        "profiling": config.get("profiling", {}),
+        "catalog": {
+            "path": os.path.join(config["target_usb_mount"], catalog1.CATALOG_FILENAME),
+            **config.get("catalog", {}),
+        },
+        **config.get("watermark_config", {}),
+    }
+
+
 def unique_output_path(path, filename):
     """
     Generates a unique output file path by appending a counter to the filename if it already exists.
@@ -4,6 +4,7 @@ from moviepy.video.VideoClip import TextClip
 from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
 import logging
 import datetime
+import traceback
 
 # Logger setup
 logging.basicConfig(level=logging.DEBUG)
@@ -38,6 +39,8 @@ def add_watermark(params):
             - username_position (tuple): Position for username watermark.
             - date_position (tuple): Position for date watermark.
             - timestamp_position (tuple): Position for timestamp watermark.
+            - frame_engine (str): "moviepy" (default) or "rawpipe" for the
+              preallocated raw-frame pipeline in frameio1.
 
     Returns:
         dict: A dictionary with the path to the watermarked video under 'to_process',
@@ -53,6 +56,24 @@ def add_watermark(params):
     if not input_video_path:
         raise ValueError("Missing required parameter: 'input_video_path'")
 
+    if params.get("frame_engine") == "rawpipe":
+        # Raw-frame engine: preallocated buffers, overlays blended in place
+        filename, ext = os.path.splitext(os.path.basename(input_video_path))
+        watermarked_video_path = os.path.join(params["download_path"], f"{filename}_watermarked{ext}")
+        try:
+            import frameio1
+
+            codecs = get_codecs_by_extension(ext)
+            frameio1.add_watermark_rawpipe(params, watermarked_video_path, codecs["video_codec"])
+            params["to_process"] = watermarked_video_path
+            return {"to_process": watermarked_video_path}
+        except Exception as e:
+            # Missing numpy, an unprobeable input, ffmpeg errors: MoviePy still works
+            logger.warning(f"Raw-frame engine failed, falling back to MoviePy: {e}")
+            logger.debug(traceback.format_exc())
+            if os.path.exists(watermarked_video_path):
+                os.remove(watermarked_video_path)
+
     try:
         # Log before loading the video file
         logger.debug(f"About to load video file from: {input_video_path}")
@@ -106,7 +127,18 @@ def add_watermark(params):
 
         # Log before exporting video
         logger.debug(f"Exporting watermarked video to: {watermarked_video_path}")
-        final.write_videofile(watermarked_video_path, codec=video_codec, audio_codec=audio_codec)
+        # Keep MoviePy's temp audio next to the output (scratch when staging)
+        # rather than in the working directory
+        temp_audiofile = os.path.join(
+            os.path.dirname(watermarked_video_path),
+            f"{filename}_TEMP_audio.{'ogg' if audio_codec == 'libvorbis' else 'm4a'}",
+        )
+        final.write_videofile(
+            watermarked_video_path,
+            codec=video_codec,
+            audio_codec=audio_codec,
+            temp_audiofile=temp_audiofile,
+        )
 
         logger.debug(f"Watermarked video saved to: {watermarked_video_path}")
         params["to_process"] = watermarked_video_path  # Update to_process after
@@ -117,8 +149,3 @@ def add_watermark(params):
         logger.error(f"Error in adding watermark: {e}")
         logger.debug(traceback.format_exc())
         return None
-
-
-if __name__ == "__main__":
-
-
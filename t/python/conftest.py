@@ -0,0 +1,6 @@
+# Python tests for lib/python_utils; run with: python -m pytest t/python
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib/python_utils"))
@@ -0,0 +1,64 @@
+import json
+
+import catalog1
+
+
+def write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_record_and_query(tmp_path):
+    catalog_path = str(tmp_path / catalog1.CATALOG_FILENAME)
+    params = {"catalog": {"path": catalog_path}}
+
+    assert catalog1.record_video(params, {"id": "a", "uploader": "x", "video_date": "20240102", "vcodec": "avc1.64"})
+    assert catalog1.record_video(params, {"id": "b", "uploader": "y", "video_date": "20240301", "vcodec": "vp9"})
+    # Later records keep fields they don't provide
+    assert catalog1.record_video(params, {"id": "a", "config_json": "/x/a.json"})
+
+    rows = catalog1.query_videos(catalog_path, uploader="x")
+    assert [row["video_id"] for row in rows] == ["a"]
+    assert rows[0]["vcodec"] == "avc1.64"
+    assert rows[0]["config_json"] == "/x/a.json"
+    assert [row["video_id"] for row in catalog1.query_videos(catalog_path, vcodec="vp9")] == ["b"]
+    assert [row["video_id"] for row in catalog1.query_videos(catalog_path, date_from="20240201")] == ["b"]
+
+
+def test_record_video_disabled(tmp_path):
+    params = {"catalog": {"enabled": False, "path": str(tmp_path / "c.sqlite3")}}
+    assert not catalog1.record_video(params, {"id": "a"})
+
+
+def test_import_sidecars_is_incremental(tmp_path):
+    catalog_path = str(tmp_path / catalog1.CATALOG_FILENAME)
+    root = tmp_path / "videos"
+    root.mkdir()
+    write(root / "a.json", {"id": "a", "original_filename": str(root / "a.mp4"), "uploader": "x"})
+    write(root / "notes.json", {"unrelated": True})
+    (root / "broken.json").write_text("{", encoding="utf-8")
+    write(root / "a.chapters.json", [{"title": "intro"}])
+    write(root / "a.job.profile.json", {"samples": 1})
+
+    first = catalog1.import_sidecars(catalog_path, str(root))
+    second = catalog1.import_sidecars(catalog_path, str(root))
+
+    assert first == {"imported": 1, "skipped": 1, "failed": 1}
+    # Unchanged files, params or not, are not parsed again
+    assert second == {"imported": 0, "skipped": 3, "failed": 0}
+    row = catalog1.query_videos(catalog_path, video_id="a")[0]
+    assert row["config_json"] == str(root / "a.json")
+
+
+def test_legacy_sidecar_keys_agree(tmp_path):
+    catalog_path = str(tmp_path / catalog1.CATALOG_FILENAME)
+    root = tmp_path / "videos"
+    root.mkdir()
+    original_filename = str(root / "legacy.mp4")
+    write(root / "legacy.json", {"original_filename": original_filename, "uploader": "x"})
+
+    catalog1.record_video({"catalog": {"path": catalog_path}, "original_filename": original_filename})
+    catalog1.import_sidecars(catalog_path, str(root))
+
+    rows = catalog1.query_videos(catalog_path)
+    assert [row["video_id"] for row in rows] == [original_filename]
@@ -0,0 +1,129 @@
+import sys
+import types
+
+import pytest
+
+import formats1
+
+
+def fmt(format_id, height=None, tbr=None, vcodec="avc1", acodec="mp4a", protocol="https", ext="mp4", **extra):
+    return dict(format_id=format_id, height=height, tbr=tbr, vcodec=vcodec, acodec=acodec,
+                protocol=protocol, ext=ext, **extra)
+
+
+def choose(formats, budget_kbps=None, max_bytes=None, duration=100, max_height=1080):
+    candidates = formats1.build_candidates(formats, duration, max_height)
+    chosen = formats1.choose_format(
+        candidates, budget_kbps, max_bytes, duration, formats1.DEFAULT_VCODEC_PREFERENCE
+    )
+    return chosen["format_id"] if chosen else None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("5000k", 5000.0), ("5M", 5000.0), (2500, 2500.0), ("", None), (None, None),
+])
+def test_parse_bitrate(value, expected):
+    assert formats1.parse_bitrate(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("500M", 500 * 1024 ** 2), ("2G", 2 * 1024 ** 3), (1048576, 1048576), (None, None),
+])
+def test_parse_size(value, expected):
+    assert formats1.parse_size(value) == expected
+
+
+def test_parse_bitrate_rejects_garbage():
+    with pytest.raises(ValueError):
+        formats1.parse_bitrate("fast")
+
+
+def test_highest_resolution_within_budget_wins():
+    formats = [fmt("360", 360, 600), fmt("720", 720, 2000), fmt("1080", 1080, 6000)]
+    assert choose(formats, budget_kbps=5000) == "720"
+
+
+def test_max_height_filters_formats():
+    formats = [fmt("720", 720, 2000), fmt("1440", 1440, 3000)]
+    assert choose(formats, budget_kbps=5000, max_height=1080) == "720"
+
+
+def test_https_dash_pair_beats_hls_muxed():
+    formats = [
+        fmt("hls", 1080, 3000, protocol="m3u8_native"),
+        fmt("video", 1080, 2800, acodec="none"),
+        fmt("audio", None, 128, vcodec="none", ext="m4a"),
+    ]
+    assert choose(formats, budget_kbps=5000) == "video+audio"
+
+
+def test_premuxed_preferred_over_merge_at_same_protocol():
+    formats = [
+        fmt("muxed", 1080, 3000),
+        fmt("video", 1080, 2800, acodec="none"),
+        fmt("audio", None, 128, vcodec="none", ext="m4a"),
+    ]
+    assert choose(formats, budget_kbps=5000) == "muxed"
+
+
+def test_cheaper_codec_preferred():
+    formats = [fmt("av1", 1080, 2000, vcodec="av01.0.08M.08"), fmt("h264", 1080, 3000, vcodec="avc1.640028")]
+    assert choose(formats, budget_kbps=5000) == "h264"
+
+
+def test_higher_fps_preferred_over_fewer_bytes():
+    formats = [fmt("30", 1080, 4000, fps=30), fmt("60", 1080, 4500, fps=60)]
+    assert choose(formats, budget_kbps=5000) == "60"
+
+
+def test_over_budget_takes_smallest_not_largest():
+    formats = [fmt("360", 360, 600), fmt("1080", 1080, 4000)]
+    assert choose(formats, budget_kbps=500) == "360"
+
+
+def test_max_filesize_limits_choice():
+    # 100 s at 4000k is 50 MB; at 600k it is 7.5 MB
+    formats = [fmt("360", 360, 600), fmt("1080", 1080, 4000)]
+    assert choose(formats, max_bytes=10 * 1000 * 1000) == "360"
+
+
+def test_merged_container_falls_back_to_mkv():
+    video = fmt("video", 1080, 2800, acodec="none", ext="mp4")
+    assert formats1.merged_ext(video, {"acodec": "opus"}) == "mkv"
+    assert formats1.merged_ext(video, {"acodec": "mp4a.40.2"}) == "mp4"
+
+
+def test_plan_format_returns_planned_filesize(monkeypatch):
+    info_dict = {
+        "duration": 100,
+        "formats": [fmt("video", 1080, 2800, acodec="none", filesize=30_000_000),
+                    fmt("audio", None, 128, vcodec="none", ext="m4a", filesize=1_500_000)],
+    }
+    requested = []
+
+    def get_metadata(params):
+        requested.append(params["url"])
+        return info_dict
+
+    monkeypatch.setitem(
+        sys.modules, "downloader5", types.SimpleNamespace(get_metadata=get_metadata)
+    )
+    result = formats1.plan_format({"url": "u", "video_download": {"bitrate": "5000k"}})
+
+    assert requested == ["u"]
+    assert result == {
+        "format_id": "video+audio",
+        "ext": "mp4",
+        "planned_filesize": 31_500_000,
+        "merge_output_format": "mp4",
+    }
+
+
+def test_plan_format_disabled(monkeypatch):
+    def get_metadata(params):
+        raise AssertionError("metadata is not needed when planning is off")
+
+    monkeypatch.setitem(
+        sys.modules, "downloader5", types.SimpleNamespace(get_metadata=get_metadata)
+    )
+    assert formats1.plan_format({"url": "u", "video_download": {"plan_formats": False}}) is None
@@ -0,0 +1,62 @@
+# Stages that need the extracted info dict must still work in a worker
+# that never ran mask_metadata for the job (restart, or retry after the
+# metadata cache was cleared)
+
+import pytest
+
+
+def test_get_metadata_extracts_again_when_not_cached(monkeypatch):
+    pytest.importorskip("yt_dlp")
+    import downloader5
+
+    extracted = []
+
+    def extract_metadata(params):
+        extracted.append(params)
+        return {"id": "a", "formats": []}
+
+    monkeypatch.setattr(downloader5, "extract_metadata", extract_metadata)
+    downloader5.clear_cached_metadata("u")
+
+    assert downloader5.get_metadata({"url": "u", "metadata_path": "/x/meta.json"}) == {"id": "a", "formats": []}
+    # The metadata sidecar is not rewritten on re-extraction
+    assert extracted[0]["metadata_path"] is None
+
+
+def test_get_metadata_uses_cache(monkeypatch):
+    pytest.importorskip("yt_dlp")
+    import downloader5
+
+    monkeypatch.setitem(downloader5._metadata_cache, "u", {"id": "cached"})
+    monkeypatch.setattr(downloader5, "extract_metadata", lambda params: pytest.fail("extracted again"))
+
+    assert downloader5.get_metadata({"url": "u"}) == {"id": "cached"}
+
+
+def test_collect_fetches_assets_when_no_background_fetch(monkeypatch):
+    pytest.importorskip("requests")
+    import fetcher1
+
+    fetched = []
+
+    def download_auxiliary_assets(params, info_dict=None):
+        fetched.append(params["original_filename"])
+        return {"auxiliary_assets_saved": {"thumbnail": "/x/v.jpg"}}
+
+    monkeypatch.setattr(fetcher1, "download_auxiliary_assets", download_auxiliary_assets)
+
+    result = fetcher1.collect_auxiliary_download({"original_filename": "/x/v.mp4"})
+
+    assert fetched == ["/x/v.mp4"]
+    assert result == {"auxiliary_assets_saved": {"thumbnail": "/x/v.jpg"}}
+
+
+def test_collect_does_not_refetch_saved_assets(monkeypatch):
+    pytest.importorskip("requests")
+    import fetcher1
+
+    monkeypatch.setattr(fetcher1, "download_auxiliary_assets", lambda params, info_dict=None: pytest.fail("refetched"))
+
+    assert fetcher1.collect_auxiliary_download(
+        {"original_filename": "/x/v.mp4", "auxiliary_assets_saved": {"thumbnail": "/x/v.jpg"}}
+    ) is None
@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import scheduler1
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / scheduler1.SCHEDULER_FILENAME)
+
+
+@pytest.fixture
+def config():
+    return dict(scheduler1.DEFAULT_SCHEDULER_CONFIG, lease_seconds=60)
+
+
+def use_stages(monkeypatch, *stages):
+    monkeypatch.setattr(scheduler1, "get_stages", lambda watermark=True: list(stages))
+
+
+def fetch(db_path, job_id):
+    connection = scheduler1.connect(db_path)
+    try:
+        return dict(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    finally:
+        connection.close()
+
+
+def test_claim_takes_highest_priority_and_sets_lease(db_path):
+    low = scheduler1.enqueue_job(db_path, {"url": "low"}, priority=0)
+    high = scheduler1.enqueue_job(db_path, {"url": "high"}, priority=5)
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+
+    assert job["id"] == high
+    assert job["state"] == scheduler1.RUNNING
+    assert job["worker_id"] == "w1"
+    assert job["lease_expires_at"] > 0
+    assert scheduler1.claim_next_job(connection, "w1", 60)["id"] == low
+    assert scheduler1.claim_next_job(connection, "w1", 60) is None
+
+
+def test_enqueue_requires_url(db_path):
+    with pytest.raises(ValueError):
+        scheduler1.enqueue_job(db_path, {})
+
+
+def test_recover_only_requeues_expired_leases(db_path):
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+    scheduler1.claim_next_job(connection, "w1", 60)
+
+    assert scheduler1.recover_jobs(connection) == 0
+    assert fetch(db_path, job_id)["state"] == scheduler1.RUNNING
+
+    connection.execute("UPDATE jobs SET lease_expires_at = 0")
+    assert scheduler1.recover_jobs(connection) == 1
+    job = fetch(db_path, job_id)
+    assert job["state"] == scheduler1.QUEUED
+    assert job["worker_id"] is None
+
+
+def test_connect_adds_lease_columns_to_old_databases(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, "
+        "priority INTEGER NOT NULL DEFAULT 0, state TEXT NOT NULL DEFAULT 'queued', "
+        "stage_index INTEGER NOT NULL DEFAULT 0, watermark INTEGER NOT NULL DEFAULT 1, "
+        "params TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+        "next_attempt_at REAL NOT NULL DEFAULT 0, last_error TEXT, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+    )
+    connection.close()
+
+    connection = scheduler1.connect(db_path)
+    columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+    assert {"worker_id", "lease_expires_at"} <= columns
+
+
+@pytest.mark.parametrize("attempts", [1, 2, 5, 20])
+def test_backoff_delay_is_jittered_and_capped(attempts):
+    delay = min(100, 10 * 2 ** (attempts - 1))
+    for _ in range(50):
+        assert delay / 2 <= scheduler1.backoff_delay(attempts, 10, 100) <= delay
+
+
+def test_run_job_checkpoints_and_resumes_at_failed_stage(db_path, config, monkeypatch):
+    calls = []
+    state = {"fail": True}
+
+    def first(params):
+        calls.append("first")
+        return {"first": 1}
+
+    def second(params):
+        calls.append("second")
+        if state["fail"]:
+            raise RuntimeError("boom")
+        return {"second": params["first"] + 1}
+
+    use_stages(monkeypatch, ("first", first, True), ("second", second, True))
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config) == scheduler1.QUEUED
+    saved = fetch(db_path, job_id)
+    assert saved["stage_index"] == 1
+    assert saved["attempts"] == 1
+    assert saved["next_attempt_at"] > 0
+    assert "second: boom" in saved["last_error"]
+    assert json.loads(saved["params"])["first"] == 1
+
+    state["fail"] = False
+    connection.execute("UPDATE jobs SET next_attempt_at = 0")
+    job = scheduler1.claim_next_job(connection, "w2", 60)
+    assert scheduler1.run_job(connection, job, config) == scheduler1.DONE
+    assert calls == ["first", "second", "second"]
+    saved = fetch(db_path, job_id)
+    assert saved["state"] == scheduler1.DONE
+    assert json.loads(saved["params"])["second"] == 2
+
+
+def test_required_stage_without_result_fails_after_max_attempts(db_path, config, monkeypatch):
+    use_stages(monkeypatch, ("empty", lambda params: None, True))
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+    config["max_attempts"] = 1
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config) == scheduler1.FAILED
+    assert fetch(db_path, job_id)["state"] == scheduler1.FAILED
+
+
+def test_optional_stage_without_result_continues(db_path, config, monkeypatch):
+    use_stages(monkeypatch, ("optional", lambda params: None, False), ("last", lambda params: {"x": 1}, True))
+    scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config) == scheduler1.DONE
+
+
+def test_lost_lease_aborts_without_overwriting_new_holder(db_path, config, monkeypatch):
+    calls = []
+
+    def taken_over(params):
+        # Another worker reclaims the job while this stage runs
+        connection = scheduler1.connect(db_path)
+        connection.execute("UPDATE jobs SET worker_id = 'w2'")
+        connection.close()
+        calls.append("taken_over")
+        return {"stale": True}
+
+    def never(params):
+        calls.append("never")
+        return {"never": True}
+
+    use_stages(monkeypatch, ("taken_over", taken_over, True), ("never", never, True))
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config) is None
+    assert calls == ["taken_over"]
+    saved = fetch(db_path, job_id)
+    assert saved["worker_id"] == "w2"
+    assert saved["state"] == scheduler1.RUNNING
+    assert saved["stage_index"] == 0
+    assert "stale" not in json.loads(saved["params"])
+
+
+def test_lost_lease_is_not_recorded_as_failure(db_path, config, monkeypatch):
+    def taken_over_then_fail(params):
+        connection = scheduler1.connect(db_path)
+        connection.execute("UPDATE jobs SET state = 'queued', worker_id = NULL")
+        connection.close()
+        raise RuntimeError("boom")
+
+    use_stages(monkeypatch, ("stage", taken_over_then_fail, True))
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config) is None
+    saved = fetch(db_path, job_id)
+    assert saved["attempts"] == 0
+    assert saved["last_error"] is None
+
+
+def test_lease_lost_event_stops_before_next_stage(db_path, config, monkeypatch):
+    lease_lost = threading.Event()
+    calls = []
+
+    def first(params):
+        calls.append("first")
+        lease_lost.set()
+        return {"first": 1}
+
+    use_stages(monkeypatch, ("first", first, True), ("second", lambda params: calls.append("second"), True))
+    scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+
+    job = scheduler1.claim_next_job(connection, "w1", 60)
+    assert scheduler1.run_job(connection, job, config, lease_lost) is None
+    assert calls == ["first"]
+
+
+def test_renew_lease_only_for_holder(db_path):
+    job_id = scheduler1.enqueue_job(db_path, {"url": "u"})
+    connection = scheduler1.connect(db_path)
+    scheduler1.claim_next_job(connection, "w1", 60)
+
+    assert scheduler1.renew_lease(connection, job_id, "w1", 60)
+    assert not scheduler1.renew_lease(connection, job_id, "w2", 60)
+
+
+def test_pending_urls_lists_unfinished_jobs(db_path, config, monkeypatch):
+    use_stages(monkeypatch, ("stage", lambda params: {"x": 1}, True))
+    scheduler1.enqueue_job(db_path, {"url": "done"}, priority=1)
+    scheduler1.enqueue_job(db_path, {"url": "queued"})
+    connection = scheduler1.connect(db_path)
+    scheduler1.run_job(connection, scheduler1.claim_next_job(connection, "w1", 60), config)
+
+    assert scheduler1.pending_urls(db_path) == {"queued"}
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import staging1
+
+
+@pytest.fixture
+def staged(tmp_path):
+    scratch = tmp_path / "scratch"
+    day = scratch / "2024-01-01"
+    target = tmp_path / "target"
+    day.mkdir(parents=True)
+    (day / "v.mp4").write_text("video", encoding="utf-8")
+    (day / "v.json").write_text("{}", encoding="utf-8")
+    params = {
+        "staging": {"enabled": True, "scratch_path": str(scratch)},
+        "download_path": str(day),
+        "target_path": str(target),
+        "original_filename": str(day / "v.mp4"),
+    }
+    return params, day, target
+
+
+def test_estimate_prefers_planned_filesize():
+    config = dict(staging1.DEFAULT_STAGING_CONFIG)
+    assert staging1.estimate_job_size({"planned_filesize": 10, "filesize": 20}, config) == 10
+    assert staging1.estimate_job_size({"tbr": 8, "duration": 10}, config) == 10000
+    assert staging1.estimate_job_size({}, config) == config["default_job_size"]
+
+
+def test_admit_job_rejects_when_target_is_short(tmp_path):
+    params = {"download_path": str(tmp_path), "planned_filesize": 1 << 60}
+    with pytest.raises(staging1.InsufficientSpaceError):
+        staging1.admit_job(params)
+
+
+def test_transfer_and_await(staged):
+    params, day, target = staged
+
+    updates = staging1.transfer_to_target(params)
+    params.update(updates)
+
+    assert updates["original_filename"] == str(target / "v.mp4")
+    assert updates["download_path"] == str(target)
+    assert updates["target_path"] is None
+    assert staging1.await_transfers(params) == {"transferred": 2}
+    assert sorted(os.listdir(target)) == ["v.json", "v.mp4"]
+    assert os.listdir(day) == []
+    assert os.listdir(os.path.join(params["staging"]["scratch_path"], staging1.TRANSFER_DIR)) == []
+
+
+def test_unstaged_job_has_no_transfers():
+    assert staging1.transfer_to_target({}) == {"transfers": []}
+    assert staging1.await_transfers({"transfers": []}) == {"transferred": 0}
+
+
+def test_failed_transfer_is_raised_and_retried(staged, monkeypatch):
+    params, day, target = staged
+    copy_file = staging1._copy_file
+    failing = {"count": 1}
+
+    def flaky_copy(src, dst, buffer_size):
+        if src.endswith(".mp4") and failing["count"]:
+            failing["count"] -= 1
+            raise OSError("disk gone")
+        copy_file(src, dst, buffer_size)
+
+    monkeypatch.setattr(staging1, "_copy_file", flaky_copy)
+    params.update(staging1.transfer_to_target(params))
+
+    with pytest.raises(OSError, match="disk gone"):
+        staging1.await_transfers(params)
+    assert os.path.exists(day / "v.mp4")
+
+    # The retry requeues the failed copy under its original manifest
+    assert staging1.await_transfers(params) == {"transferred": 2}
+    assert sorted(os.listdir(target)) == ["v.json", "v.mp4"]
+    assert os.listdir(os.path.join(params["staging"]["scratch_path"], staging1.TRANSFER_DIR)) == []
+
+
+def test_recover_skips_manifests_of_live_owner(tmp_path):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    src = scratch / "a.mp4"
+    src.write_text("a", encoding="utf-8")
+    dst = tmp_path / "a.mp4"
+    owner = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, time, staging1\n"
+         f"manifest = staging1._create_manifest({str(scratch / staging1.TRANSFER_DIR)!r}, {str(src)!r}, {str(dst)!r})\n"
+         "print('ready', flush=True)\n"
+         "sys.stdin.read()\n"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    try:
+        assert owner.stdout.readline().strip() == "ready"
+        assert staging1.recover_transfers({"staging": {"scratch_path": str(scratch)}}) == 0
+    finally:
+        owner.stdin.close()
+        owner.wait()
+
+    # The owner has exited, so its manifest can be taken over
+    assert staging1.recover_transfers({"staging": {"scratch_path": str(scratch)}}) == 1
+    assert staging1.wait_for_transfers([str(dst)]) == []
+    assert dst.read_text(encoding="utf-8") == "a"
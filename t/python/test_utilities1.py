@@ -0,0 +1,67 @@
+import gzip
+import json
+import os
+import threading
+
+import utilities1
+
+
+def test_write_json_atomic_pretty(tmp_path):
+    path = utilities1.write_json_atomic(str(tmp_path / "a.json"), {"b": 1, "a": [1, 2]})
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    assert json.loads(text) == {"b": 1, "a": [1, 2]}
+    assert text == json.dumps({"b": 1, "a": [1, 2]}, indent=4)
+    assert os.listdir(tmp_path) == ["a.json"]
+
+
+def test_write_json_atomic_compact_and_gzip(tmp_path):
+    compact = utilities1.write_json_atomic(str(tmp_path / "c.json"), {"a": 1}, encoding="compact")
+    gzipped = utilities1.write_json_atomic(str(tmp_path / "g.json"), {"a": 1}, encoding="gzip")
+
+    with open(compact, "rb") as f:
+        assert b" " not in f.read()
+    assert gzipped.endswith(".json.gz")
+    with gzip.open(gzipped, "rt", encoding="utf-8") as f:
+        assert json.load(f) == {"a": 1}
+
+
+def test_batch_defers_until_flush(tmp_path):
+    utilities1.begin_sidecar_batch()
+    try:
+        path = utilities1.write_json_atomic(str(tmp_path / "a.json"), {"a": 1})
+        immediate = utilities1.write_json_atomic(str(tmp_path / "b.json"), {"b": 1}, batch=False)
+
+        assert not os.path.exists(path)
+        assert os.path.exists(immediate)
+    finally:
+        flushed = utilities1.flush_sidecar_batch()
+
+    assert flushed == [path]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"a": 1}
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "b.json"]
+
+
+def test_flush_without_batch_is_empty():
+    assert utilities1.flush_sidecar_batch() == []
+
+
+def test_batch_is_per_thread(tmp_path):
+    utilities1.begin_sidecar_batch()
+    try:
+        written = {}
+
+        def other_thread():
+            written["path"] = utilities1.write_json_atomic(str(tmp_path / "other.json"), {"x": 1})
+            written["exists"] = os.path.exists(written["path"])
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+
+        # Another thread without a batch of its own writes straight through
+        assert written["exists"]
+    finally:
+        assert utilities1.flush_sidecar_batch() == []